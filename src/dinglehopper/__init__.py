@@ -1,29 +1,78 @@
-from .align import align, score_hint, seq_align
-from .character_error_rate import character_error_rate, character_error_rate_n
-from .edit_distance import distance, editops
-from .extracted_text import ExtractedText
-from .ocr_files import (
-    alto_namespace,
-    alto_text,
-    page_namespace,
-    page_text,
-    plain_text,
-    text,
-)
-from .word_error_rate import word_error_rate, word_error_rate_n, words
+import importlib
+import sys
+import types
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    # Static analysis sees the eager imports, see _exports below
+    from .align import Alignment, align, score_hint, seq_align, seq_align_blocks
+    from .character_error_rate import (
+        character_error_rate,
+        character_error_rate_batch,
+        character_error_rate_n,
+    )
+    from .edit_distance import distance, editops
+    from .evaluator import Evaluator
+    from .extracted_text import ExtractedText
+    from .ocr_files import (
+        alto_namespace,
+        alto_text,
+        page_namespace,
+        page_text,
+        plain_text,
+        text,
+    )
+    from .word_error_rate import (
+        word_error_rate,
+        word_error_rate_batch,
+        word_error_rate_n,
+        words,
+    )
+
+# The modules of the exported names. They are imported on first use (PEP 562), so the
+# command line tools only import what they need.
+_exports = {
+    "Alignment": "align",
+    "align": "align",
+    "score_hint": "align",
+    "seq_align": "align",
+    "seq_align_blocks": "align",
+    "character_error_rate": "character_error_rate",
+    "character_error_rate_batch": "character_error_rate",
+    "character_error_rate_n": "character_error_rate",
+    "distance": "edit_distance",
+    "editops": "edit_distance",
+    "Evaluator": "evaluator",
+    "ExtractedText": "extracted_text",
+    "alto_namespace": "ocr_files",
+    "alto_text": "ocr_files",
+    "page_namespace": "ocr_files",
+    "page_text": "ocr_files",
+    "plain_text": "ocr_files",
+    "text": "ocr_files",
+    "word_error_rate": "word_error_rate",
+    "word_error_rate_batch": "word_error_rate",
+    "word_error_rate_n": "word_error_rate",
+    "words": "word_error_rate",
+}
 
 __all__ = [
+    "Alignment",
     "editops",
     "distance",
     "align",
     "score_hint",
     "seq_align",
+    "seq_align_blocks",
     "character_error_rate",
     "character_error_rate_n",
+    "character_error_rate_batch",
     "word_error_rate",
     "word_error_rate_n",
+    "word_error_rate_batch",
     "words",
     "ExtractedText",
+    "Evaluator",
     "alto_namespace",
     "alto_text",
     "page_namespace",
@@ -31,3 +80,30 @@ __all__ = [
     "plain_text",
     "text",
 ]
+
+
+def __getattr__(name):
+    try:
+        module = _exports[name]
+    except KeyError:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}") from None
+    value = getattr(importlib.import_module(f".{module}", __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
+
+
+class _Package(types.ModuleType):
+    def __setattr__(self, name, value):
+        # Importing a submodule sets it as an attribute of the package, but some
+        # exported functions have the name of their module, e.g. align. Keep the
+        # function, like the eager imports did.
+        if name in _exports and isinstance(value, types.ModuleType):
+            return
+        super().__setattr__(name, value)
+
+
+sys.modules[__name__].__class__ = _Package
@@ -1,16 +1,25 @@
+import functools
+import itertools
 import math
 import unicodedata
+from array import array
+from bisect import bisect_left
+from collections import Counter
 from math import ceil
-from typing import Optional
+from typing import Any, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
 
-from rapidfuzz.distance import Levenshtein
-from uniseg.graphemecluster import grapheme_clusters
+import attr
+import numpy as np
+from rapidfuzz.distance import Editop, Editops, Levenshtein, Opcodes
+
+from .config import Config
+from .graphemes import grapheme_clusters
 
 
 def align(t1, t2):
     """Align text."""
-    s1 = list(grapheme_clusters(unicodedata.normalize("NFC", t1)))
-    s2 = list(grapheme_clusters(unicodedata.normalize("NFC", t2)))
+    s1 = grapheme_clusters(unicodedata.normalize("NFC", t1))
+    s2 = grapheme_clusters(unicodedata.normalize("NFC", t2))
     return seq_align(s1, s2)
 
 
@@ -30,36 +39,315 @@ def score_hint(er: float, n: int) -> Optional[int]:
     return score_hint
 
 
+# RapidFuzz searches for the distance exponentially, starting from the score hint. A
+# small initial hint is cheap for similar sequences and only costs a few extra (and
+# cheaper) passes for very different ones.
+INITIAL_SCORE_HINT = 31
+
+
+@attr.s(frozen=True)
+class Alignment:
+    """
+    Alignment of two sequences.
+
+    The edit operations are computed only once, the distance, the error rate and the
+    aligned blocks are all derived from them.
+    """
+
+    s1 = attr.ib(type=Sequence)
+    s2 = attr.ib(type=Sequence)
+    opcodes = attr.ib(type=Opcodes)
+    # False if the alignment is not guaranteed to be optimal, see anchored_editops()
+    exact = attr.ib(type=bool, default=True)
+
+    @classmethod
+    def from_sequences(
+        cls,
+        s1: Iterable[Any],
+        s2: Iterable[Any],
+        score_hint: Optional[int] = None,
+        max_cells: Optional[int] = None,
+        *,
+        anchored: Optional[bool] = None,
+    ) -> "Alignment":
+        """Align general sequences.
+
+        Sequences with more than max_cells DP matrix cells (default:
+        Config.alignment_max_cells) are aligned in linear memory.
+
+        If anchored is True (default: Config.anchored_alignment), the sequences are
+        aligned using anchored_editops().
+        """
+        if not isinstance(s1, Sequence):
+            s1 = list(s1)
+        if not isinstance(s2, Sequence):
+            s2 = list(s2)
+        if anchored is None:
+            anchored = Config.anchored_alignment
+
+        if anchored:
+            editops, exact = anchored_editops(s1, s2, max_cells=max_cells)
+            return cls(s1, s2, Opcodes.from_editops(editops), exact)
+        else:
+            opcodes = Opcodes.from_editops(_editops(s1, s2, score_hint, max_cells))
+            return cls(s1, s2, opcodes)
+
+    @functools.cached_property
+    def distance(self) -> int:
+        """The Levenshtein distance between the sequences.
+
+        This property is cached.
+        """
+        return sum(
+            max(op.src_end - op.src_start, op.dest_end - op.dest_start)
+            for op in self.opcodes
+            if op.tag != "equal"
+        )
+
+    def error_rate_n(self) -> Tuple[float, int]:
+        """
+        Compute the error rate, using s1 as the reference.
+
+        :return: error rate and length of the reference
+        """
+        d = self.distance
+        n = len(self.s1)
+
+        if d == 0:
+            return 0, n
+        if n == 0:
+            return float("inf"), n
+        return d / n, n
+
+    def blocks(self) -> Iterator[Tuple[str, Sequence, Sequence]]:
+        """Yield the aligned blocks, see seq_align_blocks()."""
+        for op in self.opcodes:
+            yield (
+                op.tag,
+                self.s1[op.src_start : op.src_end],
+                self.s2[op.dest_start : op.dest_end],
+            )
+
+
+def _editops(
+    s1: Sequence[Any],
+    s2: Sequence[Any],
+    score_hint: Optional[int] = None,
+    max_cells: Optional[int] = None,
+) -> Editops:
+    """Compute the edit operations, in linear memory for very large sequences."""
+    if score_hint is None:
+        score_hint = INITIAL_SCORE_HINT
+    if max_cells is None:
+        max_cells = Config.alignment_max_cells
+
+    if len(s1) * len(s2) > max_cells:
+        return linear_memory_editops(s1, s2, max_cells)
+    else:
+        return Levenshtein.editops(s1, s2, score_hint=score_hint)
+
+
+# Length of the k-grams that serve as anchors in anchored_editops()
+ANCHOR_LENGTH = 20
+
+
+def anchored_editops(
+    s1: Sequence[Any],
+    s2: Sequence[Any],
+    anchor_length: int = ANCHOR_LENGTH,
+    max_cells: Optional[int] = None,
+) -> Tuple[Editops, bool]:
+    """Compute the edit operations, aligning only the gaps between anchors.
+
+    Long documents are mostly aligned trivially. Anchors are k-grams (of length
+    anchor_length) that occur exactly once in both sequences. The longest chain of
+    anchors that is in order in both sequences is kept, and only the gaps between
+    the anchors are aligned exactly.
+
+    This is a heuristic: An optimal alignment does not necessarily match the anchors.
+
+    :return: the edit operations and whether they are guaranteed to be optimal
+    """
+    anchors = _find_anchors(s1, s2, anchor_length)
+    if not anchors:
+        return _editops(s1, s2, max_cells=max_cells), True
+
+    gaps = []
+    end1 = end2 = 0
+    for start1, start2, length in anchors:
+        gaps.append((end1, start1, end2, start2))
+        end1, end2 = start1 + length, start2 + length
+    gaps.append((end1, len(s1), end2, len(s2)))
+
+    def align_gap(gap: Tuple[int, int, int, int]) -> List[Tuple[str, int, int]]:
+        i1, i2, j1, j2 = gap
+        editops = _editops(s1[i1:i2], s2[j1:j2], max_cells=max_cells)
+        return [(op.tag, op.src_pos + i1, op.dest_pos + j1) for op in editops]
+
+    ops: List[Union[Editop, Tuple[str, int, int]]] = list(
+        itertools.chain.from_iterable(map(align_gap, gaps))
+    )
+    return Editops(ops, len(s1), len(s2)), False
+
+
+def _find_anchors(
+    s1: Sequence[Any], s2: Sequence[Any], k: int
+) -> List[Tuple[int, int, int]]:
+    """Find matching stretches of s1 and s2 that serve as anchors.
+
+    :return: non-overlapping (start1, start2, length) in increasing order
+    """
+
+    def kgrams(s):
+        if isinstance(s, array):
+            return [s[i : i + k].tobytes() for i in range(len(s) - k + 1)]
+        elif isinstance(s, str):
+            return [s[i : i + k] for i in range(len(s) - k + 1)]
+        else:
+            return [tuple(s[i : i + k]) for i in range(len(s) - k + 1)]
+
+    kgrams1 = kgrams(s1)
+    kgrams2 = kgrams(s2)
+    counts1 = Counter(kgrams1)
+    counts2 = Counter(kgrams2)
+    unique_pos1 = {g: i for i, g in enumerate(kgrams1) if counts1[g] == 1}
+    candidates = [
+        (unique_pos1[g], j)
+        for j, g in enumerate(kgrams2)
+        if counts2[g] == 1 and g in unique_pos1
+    ]
+
+    # The candidates are ordered by position in s2, keep the longest increasing
+    # subsequence of positions in s1 (patience sorting)
+    tails: List[int] = []  # tails[length - 1] = index of the candidate ending it
+    tail_positions: List[int] = []
+    predecessors = [-1] * len(candidates)
+    for c, (i, _) in enumerate(candidates):
+        length = bisect_left(tail_positions, i)
+        if length > 0:
+            predecessors[c] = tails[length - 1]
+        if length == len(tails):
+            tails.append(c)
+            tail_positions.append(i)
+        else:
+            tails[length] = c
+            tail_positions[length] = i
+    chain = []
+    c = tails[-1] if tails else -1
+    while c != -1:
+        chain.append(candidates[c])
+        c = predecessors[c]
+    chain.reverse()
+
+    # Merge overlapping k-grams on the same diagonal into longer anchors, drop the
+    # ones overlapping an anchor otherwise
+    anchors: List[Tuple[int, int, int]] = []
+    for i, j in chain:
+        if anchors:
+            start1, start2, length = anchors[-1]
+            end1, end2 = start1 + length, start2 + length
+            if i - j == start1 - start2 and i <= end1:
+                anchors[-1] = (start1, start2, i + k - start1)
+                continue
+            if i < end1 or j < end2:
+                continue
+        anchors.append((i, j, k))
+    return anchors
+
+
+def linear_memory_editops(
+    s1: Sequence[Any], s2: Sequence[Any], max_cells: int
+) -> Editops:
+    """Compute the edit operations transforming s1 into s2 in linear memory.
+
+    This is Hirschberg's divide and conquer algorithm: Split s1 in the middle, find
+    the split of s2 where an optimal alignment crosses and recurse into both halves.
+    Subproblems with at most max_cells DP matrix cells are aligned by RapidFuzz.
+
+    The result is an optimal alignment, i.e. it has the same distance as
+    Levenshtein.editops(), but if there is more than one optimal alignment, it may be
+    a different one.
+    """
+    ops: List[Union[Editop, Tuple[str, int, int]]] = []
+
+    def align(s1: Sequence[Any], s2: Sequence[Any], offset1: int, offset2: int) -> None:
+        if len(s1) * len(s2) <= max_cells or len(s1) < 2:
+            for op in Levenshtein.editops(s1, s2):
+                ops.append((op.tag, op.src_pos + offset1, op.dest_pos + offset2))
+            return
+
+        mid = len(s1) // 2
+        forward = np.asarray(_levenshtein_last_row(s1[:mid], s2))
+        backward = np.asarray(_levenshtein_last_row(s1[mid:][::-1], s2[::-1]))
+        split = int(np.argmin(forward + backward[::-1]))
+
+        align(s1[:mid], s2[:split], offset1, offset2)
+        align(s1[mid:], s2[split:], offset1 + mid, offset2 + split)
+
+    align(s1, s2, 0, 0)
+    return Editops(ops, len(s1), len(s2))
+
+
+def _levenshtein_last_row(s1: Sequence[Any], s2: Sequence[Any]) -> List[int]:
+    """Compute the Levenshtein distances of s1 to all prefixes of s2.
+
+    This is the last row of the DP matrix, computed column by column with Hyyrö's
+    bit-parallel algorithm, s1 being the bit vector. Python's integers serve as bit
+    vectors of arbitrary length, so this needs O(len(s1) + len(s2)) memory.
+    """
+    n = len(s1)
+    if n == 0:
+        return list(range(len(s2) + 1))
+
+    # Pattern match vectors: bit i is set if s1[i] == c
+    s1_array = np.asarray(list(s1) if isinstance(s1, str) else s1)
+    peq = {}
+    for c in np.unique(s1_array).tolist():
+        bits = np.packbits(s1_array == c, bitorder="little")
+        peq[c] = int.from_bytes(bits.tobytes(), "little")
+
+    mask = (1 << n) - 1
+    last = 1 << (n - 1)
+    vp = mask
+    vn = 0
+    dist = n
+    row = [dist]
+    for c in s2:
+        x = peq.get(c, 0)
+        d0 = ((((x & vp) + vp) ^ vp) | x | vn) & mask
+        hp = vn | (mask ^ (d0 | vp))
+        hn = d0 & vp
+        if hp & last:
+            dist += 1
+        elif hn & last:
+            dist -= 1
+        hp = ((hp << 1) | 1) & mask
+        hn = (hn << 1) & mask
+        vp = hn | (mask ^ (d0 | hp))
+        vn = hp & d0
+        row.append(dist)
+    return row
+
+
+def seq_align_blocks(s1, s2, score_hint=None):
+    """Align general sequences, block by block.
+
+    Yields tuples (tag, block1, block2), where tag is one of "equal", "replace",
+    "insert" or "delete" and block1/block2 are the corresponding slices of s1/s2.
+    Insert blocks have an empty block1, delete blocks have an empty block2. Replace
+    blocks have slices of equal length.
+    """
+    yield from Alignment.from_sequences(s1, s2, score_hint).blocks()
+
+
 def seq_align(s1, s2, score_hint=None):
     """Align general sequences."""
-    s1 = list(s1)
-    s2 = list(s2)
-    ops = Levenshtein.editops(s1, s2, score_hint=score_hint)
-    i = 0
-    j = 0
-
-    while i < len(s1) or j < len(s2):
-        o = None
-        try:
-            ot = ops[0]
-            if ot[1] == i and ot[2] == j:
-                del ops[0]
-                o = ot
-        except IndexError:
-            pass
-
-        if o:
-            if o[0] == "insert":
-                yield None, s2[j]
-                j += 1
-            elif o[0] == "delete":
-                yield s1[i], None
-                i += 1
-            elif o[0] == "replace":
-                yield s1[i], s2[j]
-                i += 1
-                j += 1
+    for tag, block1, block2 in seq_align_blocks(s1, s2, score_hint):
+        if tag == "insert":
+            for e2 in block2:
+                yield None, e2
+        elif tag == "delete":
+            for e1 in block1:
+                yield e1, None
         else:
-            yield s1[i], s2[j]
-            i += 1
-            j += 1
+            yield from zip(block1, block2)
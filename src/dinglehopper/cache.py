@@ -0,0 +1,136 @@
+import functools
+import hashlib
+import logging
+import os
+import pickle
+import tempfile
+from typing import Any, List, Optional, Tuple
+
+log = logging.getLogger("processor.OcrdDinglehopperEvaluate")
+
+
+@functools.lru_cache(maxsize=None)
+def _version(distribution: str) -> str:
+    from importlib.metadata import PackageNotFoundError, version
+
+    try:
+        return version(distribution)
+    except PackageNotFoundError:
+        return "unknown"
+
+
+class ExtractionCache:
+    """
+    An on-disk cache of extracted texts, e.g. of GT documents.
+
+    The entries are pickled ExtractedText objects. When the total size of the entries
+    exceeds max_size bytes, the least recently used entries are removed. The cache
+    may be shared by several processes.
+
+    The total size is only counted from the directory on the first put() and when
+    it seems to exceed max_size, otherwise it is updated with the sizes of the new
+    entries. Entries added by other processes are therefore noticed late.
+    """
+
+    # Remove entries until the total size is this fraction of max_size, so the
+    # directory is not scanned again on the next put()
+    EVICT_TO = 0.9
+
+    def __init__(self, directory: str, max_size: int = 2**30) -> None:
+        self.directory = directory
+        self.max_size = max_size
+        self._size: Optional[int] = None
+        os.makedirs(directory, exist_ok=True)
+
+    def key(self, filename: str, *params: Any, data: Optional[Any] = None) -> str:
+        """
+        Return the cache key for the given file and extraction parameters.
+
+        The key covers the content of the file, the parameters and the versions of
+        dinglehopper and uniseg (which determines the grapheme clusters). If the
+        content of the file was already read or memory-mapped, give it as data.
+        """
+        h = hashlib.sha256()
+        h.update(repr((_version("dinglehopper"), _version("uniseg"))).encode())
+        h.update(repr(params).encode())
+        if data is not None:
+            h.update(data)
+        else:
+            with open(filename, "rb") as f:
+                for chunk in iter(lambda: f.read(2**20), b""):
+                    h.update(chunk)
+        return h.hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key + ".pickle")
+
+    def get(self, key: str) -> Optional[Any]:
+        """Return the cached value for key, or None if there is none."""
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                value = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception:
+            log.warning("Removing unreadable cache entry %s", path)
+            self._remove(path)
+            return None
+        # The modification time marks the last use
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        return value
+
+    def put(self, key: str, value: Any) -> None:
+        """Store value for key and remove the least recently used entries if needed."""
+        if self._size is None:
+            self._size = self._total_size()
+
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+                size = f.tell()
+            os.replace(tmp_path, self._path(key))
+        except BaseException:
+            self._remove(tmp_path)
+            raise
+
+        self._size += size
+        if self._size > self.max_size:
+            self._evict()
+
+    def _entries(self) -> List[Tuple[float, int, str]]:
+        """Return the modification time, size and path of all entries."""
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".pickle"):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def _total_size(self) -> int:
+        return sum(size for _, size, _ in self._entries())
+
+    def _evict(self) -> None:
+        entries = self._entries()
+        total_size = sum(size for _, size, _ in entries)
+        if total_size > self.max_size:
+            for _, size, path in sorted(entries):
+                if total_size <= self.max_size * self.EVICT_TO:
+                    break
+                self._remove(path)
+                total_size -= size
+        self._size = total_size
+
+    @staticmethod
+    def _remove(path: str) -> None:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
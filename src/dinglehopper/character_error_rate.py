@@ -1,11 +1,16 @@
 import unicodedata
-from typing import List, Tuple, TypeVar
+from array import array
+from typing import List, Sequence, Tuple, TypeVar, Union
 
+import numpy as np
 from multimethod import multimethod
-from uniseg.graphemecluster import grapheme_clusters
+from rapidfuzz.distance import Levenshtein
 
-from .edit_distance import distance
+from .align import Alignment
+from .edit_distance import distance, distance_batch
 from .extracted_text import ExtractedText
+from .graphemes import grapheme_clusters
+from .vocabulary import Vocabulary
 
 T = TypeVar("T")
 
@@ -22,30 +27,81 @@ def character_error_rate_n(
 
     d = distance(reference, compared)
     n = len(reference)
-
-    if d == 0:
-        return 0, n
-    if n == 0:
-        return float("inf"), n
-    return d / n, n
+    return _error_rate_n(d, n)
 
     # XXX Should we really count newlines here?
 
 
 @character_error_rate_n.register
 def _(reference: str, compared: str) -> Tuple[float, int]:
-    seq1 = list(grapheme_clusters(unicodedata.normalize("NFC", reference)))
-    seq2 = list(grapheme_clusters(unicodedata.normalize("NFC", compared)))
+    seq1 = grapheme_clusters(unicodedata.normalize("NFC", reference))
+    seq2 = grapheme_clusters(unicodedata.normalize("NFC", compared))
     cer, n = character_error_rate_n(seq1, seq2)
     return cer, n
 
 
 @character_error_rate_n.register
 def _(reference: ExtractedText, compared: ExtractedText) -> Tuple[float, int]:
-    cer, n = character_error_rate_n(
-        reference.grapheme_clusters, compared.grapheme_clusters
-    )
-    return cer, n
+    # Compare the integer-encoded grapheme clusters, this is faster than comparing
+    # the grapheme clusters themselves. The vocabulary only lives for this call.
+    vocabulary: Vocabulary[str] = Vocabulary()
+    seq1 = reference.encode_grapheme_clusters(vocabulary)
+    seq2 = compared.encode_grapheme_clusters(vocabulary)
+    return _error_rate_n(Levenshtein.distance(seq1, seq2), len(seq1))
+
+
+@character_error_rate_n.register
+def _(alignment: Alignment) -> Tuple[float, int]:
+    """Compute character error rate from an alignment of grapheme clusters."""
+    return alignment.error_rate_n()
+
+
+def _error_rate_n(d: int, n: int) -> Tuple[float, int]:
+    if d == 0:
+        return 0, n
+    if n == 0:
+        return float("inf"), n
+    return d / n, n
+
+
+def _error_rates(d: np.ndarray, n: np.ndarray) -> np.ndarray:
+    """Vectorized version of _error_rate_n(), returning only the error rates."""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rates: np.ndarray = d / n
+    rates[d == 0] = 0
+    return rates
+
+
+def _grapheme_cluster_codes(
+    s: Union[str, ExtractedText], vocabulary: Vocabulary[str]
+) -> array:
+    if isinstance(s, ExtractedText):
+        return s.encode_grapheme_clusters(vocabulary)
+    return vocabulary.encode(grapheme_clusters(unicodedata.normalize("NFC", s)))
+
+
+def character_error_rate_batch(
+    references: Sequence[Union[str, ExtractedText]],
+    compared: Sequence[Union[str, ExtractedText]],
+    *,
+    workers: int = -1,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Compute character error rates of many pairs, e.g. lines, at once.
+
+    references[i] is compared with compared[i]. The edit distances are computed in
+    RapidFuzz using the given number of threads (-1: all CPUs).
+
+    :return: edit distances, lengths of the references and character error rates,
+        as NumPy arrays
+    """
+    # The grapheme clusters are encoded with a vocabulary of this batch only
+    vocabulary: Vocabulary[str] = Vocabulary()
+    seqs1 = [_grapheme_cluster_codes(s, vocabulary) for s in references]
+    seqs2 = [_grapheme_cluster_codes(s, vocabulary) for s in compared]
+    d = distance_batch(seqs1, seqs2, workers=workers)
+    n = np.fromiter(map(len, seqs1), dtype=np.int64, count=len(seqs1))
+    return d, n, _error_rates(d, n)
 
 
 def character_error_rate(reference: T, compared: T) -> float:
@@ -1,108 +1,66 @@
+import functools
+import logging
 import os
-from collections import Counter
-from typing import List
+from typing import TYPE_CHECKING, Any, List, Optional
 
 import click
-from jinja2 import Environment, FileSystemLoader
-from markupsafe import escape
-from ocrd_utils import initLogging
 
-from dinglehopper.align import score_hint, seq_align
-from dinglehopper.character_error_rate import character_error_rate_n
 from dinglehopper.config import Config
-from dinglehopper.extracted_text import ExtractedText
-from dinglehopper.ocr_files import extract
-from dinglehopper.word_error_rate import word_error_rate_n, words_normalized
 
+if TYPE_CHECKING:
+    from dinglehopper.cache import ExtractionCache
 
-def gen_diff_report(
-    gt_in, ocr_in, css_prefix, joiner, none, *, differences=False, score_hint=None
-):
-    gtx = ""
-    ocrx = ""
-
-    def format_thing(t, css_classes=None, id_=None):
-        if t is None:
-            html_t = none
-            css_classes += " ellipsis"
-        elif t == "\n":
-            html_t = "<br>"
-        else:
-            html_t = escape(t)
+# The command line tools import the modules doing the actual work on first use, so
+# they start quickly. This is what ocrd_utils.getLogger() returns.
+log = logging.getLogger("processor.OcrdDinglehopperEvaluate")
 
-        html_custom_attrs = ""
 
-        # Set Bootstrap tooltip to the segment id
-        if id_:
-            html_custom_attrs += f'data-toggle="tooltip" title="{id_}"'
+def __getattr__(name):
+    # These moved to dinglehopper.evaluator and dinglehopper.templating
+    if name in ("Evaluator", "gen_diff_report"):
+        from dinglehopper import evaluator
 
-        if css_classes:
-            return f'<span class="{css_classes}" {html_custom_attrs}>{html_t}</span>'
-        else:
-            return f"{html_t}"
+        return getattr(evaluator, name)
+    if name in ("json_float", "template_environment"):
+        from dinglehopper import templating
 
-    if isinstance(gt_in, ExtractedText):
-        if not isinstance(ocr_in, ExtractedText):
-            raise TypeError()
-        gt_things = gt_in.grapheme_clusters
-        ocr_things = ocr_in.grapheme_clusters
-    else:
-        gt_things = gt_in
-        ocr_things = ocr_in
-
-    g_pos = 0
-    o_pos = 0
-    found_differences = []
-
-    for k, (g, o) in enumerate(seq_align(gt_things, ocr_things, score_hint)):
-        css_classes = None
-        gt_id = None
-        ocr_id = None
-        if g != o:
-            css_classes = "{css_prefix}diff{k} diff".format(css_prefix=css_prefix, k=k)
-            if isinstance(gt_in, ExtractedText):
-                gt_id = gt_in.segment_id_for_pos(g_pos) if g is not None else None
-                ocr_id = ocr_in.segment_id_for_pos(o_pos) if o is not None else None
-                # Deletions and inserts only produce one id + None, UI must
-                # support this, i.e. display for the one id produced
-
-            if differences:
-                found_differences.append(f"{g} :: {o}")
-
-        gtx += joiner + format_thing(g, css_classes, gt_id)
-        ocrx += joiner + format_thing(o, css_classes, ocr_id)
-
-        if g is not None:
-            g_pos += len(g)
-        if o is not None:
-            o_pos += len(o)
-
-    counted_differences = dict(Counter(elem for elem in found_differences))
-
-    return (
-        """
-        <div class="row">
-           <div class="col-md-6 gt">{}</div>
-           <div class="col-md-6 ocr">{}</div>
-        </div>
-        """.format(
-            gtx, ocrx
-        ),
-        counted_differences,
-    )
+        return getattr(templating, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
-def json_float(value):
-    """Convert a float value to an JSON float.
+def write_reports(
+    template_name: str, report_prefix: str, reports_folder: str, **context: Any
+) -> None:
+    """Render the report templates to $reports_folder/$report_prefix.{html,json}."""
+    from dinglehopper.templating import template_environment
+
+    env = template_environment()
+
+    for report_suffix in (".html", ".json"):
+        template_fn = template_name + report_suffix + ".j2"
+
+        # Parallel processes may create the folder at the same time
+        os.makedirs(reports_folder, exist_ok=True)
+
+        out_fn = os.path.join(reports_folder, report_prefix + report_suffix)
+
+        template = env.get_template(template_fn)
+        template.stream(**context).dump(out_fn)
+
+
+def extraction_cache() -> Optional["ExtractionCache"]:
+    """Return the extraction cache for the GT, if it is configured."""
+    if Config.extraction_cache_dir is None:
+        return None
+    return _extraction_cache(Config.extraction_cache_dir, Config.extraction_cache_size)
 
-    This is here so that float('inf') yields "Infinity", not "inf".
-    """
-    if value == float("inf"):
-        return "Infinity"
-    elif value == float("-inf"):
-        return "-Infinity"
-    else:
-        return str(value)
+
+@functools.lru_cache(maxsize=None)
+def _extraction_cache(directory: str, max_size: int) -> "ExtractionCache":
+    # One cache object per process, as it keeps track of the size of the cache
+    from dinglehopper.cache import ExtractionCache
+
+    return ExtractionCache(directory, max_size)
 
 
 def process(
@@ -115,80 +73,26 @@ def process(
     differences: bool = False,
     textequiv_level: str = "region",
     plain_encoding: str = "autodetect",
+    normalization: str = "nfc_sbb",
 ) -> None:
     """Check OCR result against GT.
 
     The @click decorators change the signature of the decorated functions, so we keep
-    this undecorated version and use Click on a wrapper.
+    this undecorated version and use Click on a wrapper. For many evaluations, use an
+    Evaluator directly.
     """
+    from dinglehopper.evaluator import Evaluator
 
-    gt_text = extract(
-        gt, textequiv_level=textequiv_level, plain_encoding=plain_encoding
-    )
-    ocr_text = extract(
-        ocr, textequiv_level=textequiv_level, plain_encoding=plain_encoding
-    )
-    gt_words: List[str] = list(words_normalized(gt_text))
-    ocr_words: List[str] = list(words_normalized(ocr_text))
-
-    assert isinstance(gt_text, ExtractedText)
-    assert isinstance(ocr_text, ExtractedText)
-    cer, n_characters = character_error_rate_n(gt_text, ocr_text)
-    char_diff_report, diff_c = gen_diff_report(
-        gt_text,
-        ocr_text,
-        css_prefix="c",
-        joiner="",
-        none="·",
-        score_hint=score_hint(cer, n_characters),
+    evaluator = Evaluator(
+        metrics=metrics,
         differences=differences,
+        textequiv_level=textequiv_level,
+        plain_encoding=plain_encoding,
+        normalization=normalization,
+        cache=extraction_cache(),
     )
-
-    # {gt,ocr}_words must not be a generator, so we don't drain it for the differences
-    # report.
-    assert isinstance(gt_words, list)
-    assert isinstance(ocr_words, list)
-    wer, n_words = word_error_rate_n(gt_words, ocr_words)
-    word_diff_report, diff_w = gen_diff_report(
-        gt_words,
-        ocr_words,
-        css_prefix="w",
-        joiner=" ",
-        none="⋯",
-        score_hint=score_hint(wer, n_words),
-        differences=differences,
-    )
-
-    env = Environment(
-        loader=FileSystemLoader(
-            os.path.join(os.path.dirname(os.path.realpath(__file__)), "templates")
-        )
-    )
-    env.filters["json_float"] = json_float
-
-    for report_suffix in (".html", ".json"):
-        template_fn = "report" + report_suffix + ".j2"
-
-        if not os.path.isdir(reports_folder):
-            os.mkdir(reports_folder)
-
-        out_fn = os.path.join(reports_folder, report_prefix + report_suffix)
-
-        template = env.get_template(template_fn)
-        template.stream(
-            gt=gt,
-            ocr=ocr,
-            cer=cer,
-            n_characters=n_characters,
-            wer=wer,
-            n_words=n_words,
-            char_diff_report=char_diff_report,
-            word_diff_report=word_diff_report,
-            metrics=metrics,
-            differences=differences,
-            diff_c=diff_c,
-            diff_w=diff_w,
-        ).dump(out_fn)
+    result = evaluator.evaluate(gt, ocr)
+    evaluator.write_reports(result, report_prefix, reports_folder)
 
 
 def process_dir(
@@ -201,25 +105,90 @@ def process_dir(
     differences: bool = False,
     textequiv_level: str = "region",
     plain_encoding: str = "autodetect",
-) -> None:
-    for gt_file in os.listdir(gt):
+    normalization: str = "nfc_sbb",
+    jobs: Optional[int] = None,
+) -> List[str]:
+    """Check all OCR results in directory ocr against the GT in directory gt.
+
+    The files are processed in parallel by `jobs` processes, defaulting to the number
+    of CPUs. A file that fails is logged and does not stop the other files from being
+    processed.
+
+    :return: the GT files that failed
+    """
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+
+    from tqdm import tqdm
+
+    gt_files = []
+    for gt_file in sorted(os.listdir(gt)):
         gt_file_path = os.path.join(gt, gt_file)
         ocr_file_path = os.path.join(ocr, gt_file)
 
         if os.path.isfile(gt_file_path) and os.path.isfile(ocr_file_path):
-            process(
-                gt_file_path,
-                ocr_file_path,
-                f"{gt_file}-{report_prefix}",
-                reports_folder=reports_folder,
-                metrics=metrics,
-                differences=differences,
-                textequiv_level=textequiv_level,
-                plain_encoding=plain_encoding,
-            )
+            gt_files.append(gt_file)
         else:
             print("Skipping {0} and {1}".format(gt_file_path, ocr_file_path))
 
+    def process_args(gt_file):
+        return (
+            os.path.join(gt, gt_file),
+            os.path.join(ocr, gt_file),
+            f"{gt_file}-{report_prefix}",
+        )
+
+    process_file = functools.partial(
+        process,
+        reports_folder=reports_folder,
+        metrics=metrics,
+        differences=differences,
+        textequiv_level=textequiv_level,
+        plain_encoding=plain_encoding,
+        normalization=normalization,
+    )
+
+    failed = []
+    with tqdm(total=len(gt_files), disable=not Config.progress) as progress_bar:
+        if jobs == 1:
+            for gt_file in gt_files:
+                try:
+                    process_file(*process_args(gt_file))
+                except Exception:
+                    log.exception("Failed to process %s", gt_file)
+                    failed.append(gt_file)
+                progress_bar.update()
+        else:
+            with ProcessPoolExecutor(
+                max_workers=jobs,
+                initializer=Config.set_state,
+                initargs=(Config.get_state(),),
+            ) as executor:
+                futures = {
+                    executor.submit(process_file, *process_args(gt_file)): gt_file
+                    for gt_file in gt_files
+                }
+                for future in as_completed(futures):
+                    gt_file = futures[future]
+                    try:
+                        future.result()
+                    except Exception:
+                        log.exception("Failed to process %s", gt_file)
+                        failed.append(gt_file)
+                    progress_bar.update()
+
+    return sorted(failed)
+
+
+def check_normalization(ctx, param, value):
+    """Click callback to check the --normalization option."""
+    from dinglehopper.extracted_text import get_normalizer
+
+    try:
+        get_normalizer(value)
+    except ValueError as e:
+        raise click.BadParameter(str(e)) from e
+    return value
+
 
 @click.command()
 @click.argument("gt", type=click.Path(exists=True))
@@ -245,7 +214,40 @@ def process_dir(
     default="autodetect",
     help='Encoding (e.g. "utf-8") of plain text files',
 )
+@click.option(
+    "--normalization",
+    default="nfc_sbb",
+    callback=check_normalization,
+    help='Normalization profile, "nfc", "nfc_sbb" or the path of a JSON profile file',
+    metavar="PROFILE",
+)
+@click.option(
+    "--cache-dir",
+    type=click.Path(file_okay=False),
+    default=None,
+    help="Cache the extracted GT in this directory, for repeated evaluations",
+)
+@click.option(
+    "--cache-size",
+    type=click.IntRange(min=0),
+    default=1024,
+    help="Maximum size of the GT cache in MiB (default: 1024)",
+)
 @click.option("--progress", default=False, is_flag=True, help="Show progress bar")
+@click.option(
+    "--anchored-alignment",
+    default=False,
+    is_flag=True,
+    help="Align long documents faster using anchors, the alignment may not be optimal",
+)
+@click.option(
+    "--jobs",
+    "-j",
+    type=click.IntRange(min=1),
+    default=None,
+    help="Number of files to process in parallel in directory mode"
+    " (default: number of CPUs)",
+)
 @click.version_option()
 def main(
     gt,
@@ -256,7 +258,12 @@ def main(
     differences,
     textequiv_level,
     plain_encoding,
+    normalization,
+    cache_dir,
+    cache_size,
     progress,
+    anchored_alignment,
+    jobs,
 ):
     """
     Compare the PAGE/ALTO/text document GT against the document OCR.
@@ -276,16 +283,31 @@ def main(
 
     By default, the text of PAGE files is extracted on 'region' level. You may
     use "--textequiv-level line" to extract from the level of TextLine tags.
+
+    The texts are normalized using the SBB's rules ("nfc_sbb") by default. Use
+    --normalization to select a different profile, e.g. "nfc" or your own JSON
+    profile file.
+
+    When evaluating against the same GT repeatedly, use --cache-dir to keep the
+    extracted GT texts in a cache.
+
+    If GT and OCR are directories, the files with the same name are compared, in
+    parallel using --jobs processes.
     """
+    from ocrd_utils import initLogging
+
     initLogging()
     Config.progress = progress
+    Config.anchored_alignment = anchored_alignment
+    Config.extraction_cache_dir = cache_dir
+    Config.extraction_cache_size = cache_size * 2**20
     if os.path.isdir(gt):
         if not os.path.isdir(ocr):
             raise click.BadParameter(
                 "OCR must be a directory if GT is a directory", param_hint="ocr"
             )
         else:
-            process_dir(
+            failed = process_dir(
                 gt,
                 ocr,
                 report_prefix,
@@ -294,7 +316,13 @@ def main(
                 differences=differences,
                 textequiv_level=textequiv_level,
                 plain_encoding=plain_encoding,
+                normalization=normalization,
+                jobs=jobs,
             )
+            if failed:
+                raise click.ClickException(
+                    "Failed to process {}".format(", ".join(failed))
+                )
     else:
         process(
             gt,
@@ -305,6 +333,7 @@ def main(
             differences=differences,
             textequiv_level=textequiv_level,
             plain_encoding=plain_encoding,
+            normalization=normalization,
         )
 
 
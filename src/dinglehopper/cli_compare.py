@@ -0,0 +1,285 @@
+import logging
+import os
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Sequence, Tuple
+
+import click
+
+from dinglehopper.cli import check_normalization, extraction_cache, write_reports
+from dinglehopper.config import Config
+
+if TYPE_CHECKING:
+    from dinglehopper.evaluator import Evaluator
+    from dinglehopper.extracted_text import ExtractedText
+
+log = logging.getLogger("processor.OcrdDinglehopperEvaluate")
+
+# The GT and the Evaluator shared by all comparisons of a (worker) process, see
+# _init_worker()
+_gt: Optional[str] = None
+_gt_text: Optional["ExtractedText"] = None
+_evaluator: Optional["Evaluator"] = None
+_reports_folder = "."
+
+
+def report_prefixes(ocrs: Sequence[str], report_prefix: str = "report") -> List[str]:
+    """Return the report prefix for each OCR file.
+
+    The prefixes are made from the file names, or from the paths relative to the
+    common parent directory if the file names are not unique.
+    """
+    names = [os.path.basename(ocr) for ocr in ocrs]
+    if len(set(names)) < len(names):
+        paths = [os.path.abspath(ocr) for ocr in ocrs]
+        common = os.path.commonpath(paths)
+        names = [os.path.relpath(path, common).replace(os.sep, "_") for path in paths]
+    if len(set(names)) < len(names):
+        raise ValueError("The OCR files must be unique")
+    return [f"{name}-{report_prefix}" for name in names]
+
+
+def _init_worker(
+    gt: str,
+    gt_text: "ExtractedText",
+    reports_folder: str,
+    options: Dict[str, Any],
+    config: Dict[str, Any],
+) -> None:
+    from dinglehopper.evaluator import Evaluator
+
+    # Worker processes that are not forked do not inherit the Config
+    Config.set_state(config)
+    global _gt, _gt_text, _evaluator, _reports_folder
+    _gt, _gt_text, _reports_folder = gt, gt_text, reports_folder
+    _evaluator = Evaluator(normalization=gt_text.normalization, **options)
+    # Encode the GT once per worker, all comparisons of the worker reuse it
+    _ = gt_text.encoded
+
+
+def _compare(ocr: str, report_prefix: str) -> Dict[str, Any]:
+    assert _gt is not None and _gt_text is not None and _evaluator is not None
+
+    result = _evaluator.compare(_gt_text, _evaluator.extract(ocr), _gt, ocr)
+    _evaluator.write_reports(result, report_prefix, _reports_folder)
+    return {
+        "ocr": ocr,
+        "report": report_prefix,
+        "cer": result.cer,
+        "wer": result.wer,
+        "n_characters": result.n_characters,
+        "n_words": result.n_words,
+    }
+
+
+def process(
+    gt: str,
+    ocrs: Sequence[str],
+    report_prefix: str = "report",
+    reports_folder: str = ".",
+    *,
+    metrics: bool = True,
+    differences: bool = False,
+    textequiv_level: str = "region",
+    plain_encoding: str = "autodetect",
+    normalization: str = "nfc_sbb",
+    jobs: Optional[int] = None,
+) -> Tuple[List[Dict[str, Any]], List[str]]:
+    """Compare several OCR results against the same GT.
+
+    The GT is extracted, normalized and split into words only once, and encoded
+    once per worker process (see ExtractedText.encoded). The OCR files are compared
+    in parallel, using jobs processes, and each comparison writes the report
+    $reports_folder/$OCR_NAME-$report_prefix.{html,json}. The comparison table of all
+    OCR files is written to
+    $reports_folder/$report_prefix-comparison.{html,json}.
+
+    :return: the comparison table rows, in the order of ocrs, and the OCR files that
+        failed
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    from tqdm import tqdm
+
+    from dinglehopper.evaluator import Evaluator
+
+    options: Dict[str, Any] = dict(
+        metrics=metrics,
+        differences=differences,
+        textequiv_level=textequiv_level,
+        plain_encoding=plain_encoding,
+    )
+    evaluator = Evaluator(
+        normalization=normalization, cache=extraction_cache(), **options
+    )
+    gt_text = evaluator.extract(gt, cache=True)
+    # Split the GT into words before it is pickled for the workers
+    _ = gt_text.words
+    prefixes = report_prefixes(ocrs, report_prefix)
+    init_args = (gt, gt_text, reports_folder, options, Config.get_state())
+
+    results: Dict[str, Dict[str, Any]] = {}
+    failed = []
+    with tqdm(total=len(ocrs), disable=not Config.progress) as progress_bar:
+        if jobs == 1:
+            _init_worker(*init_args)
+            for ocr, prefix in zip(ocrs, prefixes):
+                try:
+                    results[ocr] = _compare(ocr, prefix)
+                except Exception:
+                    log.exception("Failed to process %s", ocr)
+                    failed.append(ocr)
+                progress_bar.update()
+        else:
+            with ProcessPoolExecutor(
+                max_workers=jobs, initializer=_init_worker, initargs=init_args
+            ) as executor:
+                futures = {
+                    ocr: executor.submit(_compare, ocr, prefix)
+                    for ocr, prefix in zip(ocrs, prefixes)
+                }
+                for ocr, future in futures.items():
+                    try:
+                        results[ocr] = future.result()
+                    except Exception:
+                        log.exception("Failed to process %s", ocr)
+                        failed.append(ocr)
+                    progress_bar.update()
+
+    rows = [results[ocr] for ocr in ocrs if ocr in results]
+    write_reports(
+        "compare",
+        f"{report_prefix}-comparison",
+        reports_folder,
+        gt=gt,
+        rows=rows,
+        metrics=metrics,
+    )
+    return rows, failed
+
+
+@click.command()
+@click.argument("gt", type=click.Path(exists=True, dir_okay=False))
+@click.argument("ocrs", type=click.Path(exists=True, dir_okay=False), nargs=-1)
+@click.option(
+    "--report-prefix", default="report", help="Prefix of the report file names"
+)
+@click.option(
+    "--reports-folder",
+    type=click.Path(file_okay=False),
+    default=".",
+    help="Folder to write the reports to",
+)
+@click.option(
+    "--metrics/--no-metrics", default=True, help="Enable/disable metrics and green/red"
+)
+@click.option(
+    "--differences",
+    default=False,
+    help="Enable reporting character and word level differences",
+)
+@click.option(
+    "--textequiv-level",
+    default="region",
+    help="PAGE TextEquiv level to extract text from",
+    metavar="LEVEL",
+)
+@click.option(
+    "--plain-encoding",
+    default="autodetect",
+    help='Encoding (e.g. "utf-8") of plain text files',
+)
+@click.option(
+    "--normalization",
+    default="nfc_sbb",
+    callback=check_normalization,
+    help='Normalization profile, "nfc", "nfc_sbb" or the path of a JSON profile file',
+    metavar="PROFILE",
+)
+@click.option(
+    "--cache-dir",
+    type=click.Path(file_okay=False),
+    default=None,
+    help="Cache the extracted GT in this directory, for repeated evaluations",
+)
+@click.option(
+    "--cache-size",
+    type=click.IntRange(min=0),
+    default=1024,
+    help="Maximum size of the GT cache in MiB (default: 1024)",
+)
+@click.option("--progress", default=False, is_flag=True, help="Show progress bar")
+@click.option(
+    "--anchored-alignment",
+    default=False,
+    is_flag=True,
+    help="Align long documents faster using anchors, the alignment may not be optimal",
+)
+@click.option(
+    "--jobs",
+    "-j",
+    type=click.IntRange(min=1),
+    default=None,
+    help="Number of OCR files to process in parallel (default: number of CPUs)",
+)
+def main(
+    gt,
+    ocrs,
+    report_prefix,
+    reports_folder,
+    metrics,
+    differences,
+    textequiv_level,
+    plain_encoding,
+    normalization,
+    cache_dir,
+    cache_size,
+    progress,
+    anchored_alignment,
+    jobs,
+):
+    """
+    Compare the PAGE/ALTO/text document GT against each of the documents OCRS.
+
+    This is the same as running dinglehopper for each OCR document, but the GT is
+    only extracted once and the OCR documents are compared in parallel, using
+    --jobs processes.
+
+    The report of each OCR document is written to
+    $REPORTS_FOLDER/$OCR_NAME-$REPORT_PREFIX.{html,json}, where $OCR_NAME is the
+    file name of the OCR document (or its path relative to the common directory of
+    all OCR documents, if the file names are not unique). A table comparing the
+    error rates of all OCR documents is written to
+    $REPORTS_FOLDER/$REPORT_PREFIX-comparison.{html,json}.
+    """
+    if not ocrs:
+        raise click.UsageError("At least one OCR document is required")
+    try:
+        report_prefixes(ocrs, report_prefix)
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint="ocrs") from e
+
+    from ocrd_utils import initLogging
+
+    initLogging()
+    Config.progress = progress
+    Config.anchored_alignment = anchored_alignment
+    Config.extraction_cache_dir = cache_dir
+    Config.extraction_cache_size = cache_size * 2**20
+
+    _, failed = process(
+        gt,
+        ocrs,
+        report_prefix,
+        reports_folder,
+        metrics=metrics,
+        differences=differences,
+        textequiv_level=textequiv_level,
+        plain_encoding=plain_encoding,
+        normalization=normalization,
+        jobs=jobs,
+    )
+    if failed:
+        raise click.ClickException("Failed to process {}".format(", ".join(failed)))
+
+
+if __name__ == "__main__":
+    main()
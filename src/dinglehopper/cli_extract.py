@@ -1,7 +1,6 @@
 import click
-from ocrd_utils import initLogging
 
-from .ocr_files import extract
+from .cli import check_normalization
 
 
 @click.command()
@@ -17,7 +16,14 @@ from .ocr_files import extract
     default="autodetect",
     help='Encoding (e.g. "utf-8") of plain text files',
 )
-def main(input_file, textequiv_level, plain_encoding):
+@click.option(
+    "--normalization",
+    default="nfc_sbb",
+    callback=check_normalization,
+    help='Normalization profile, "nfc", "nfc_sbb" or the path of a JSON profile file',
+    metavar="PROFILE",
+)
+def main(input_file, textequiv_level, plain_encoding, normalization):
     """
     Extract the text of the given INPUT_FILE.
 
@@ -27,9 +33,16 @@ def main(input_file, textequiv_level, plain_encoding):
     By default, the text of PAGE files is extracted on 'region' level. You may
     use "--textequiv-level line" to extract from the level of TextLine tags.
     """
+    from ocrd_utils import initLogging
+
+    from .ocr_files import extract
+
     initLogging()
     input_text = extract(
-        input_file, textequiv_level=textequiv_level, plain_encoding=plain_encoding
+        input_file,
+        textequiv_level=textequiv_level,
+        plain_encoding=plain_encoding,
+        normalization=normalization,
     ).text
     print(input_text)
 
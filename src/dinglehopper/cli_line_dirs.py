@@ -1,16 +1,12 @@
+import contextlib
 import itertools
 import os
-from typing import Callable, Iterator, List, Optional, Tuple
+from typing import Any, Callable, Iterator, Optional, Tuple
 
 import click
-from jinja2 import Environment, FileSystemLoader
-from ocrd_utils import initLogging
 
-from .align import score_hint
-from .character_error_rate import character_error_rate_n
-from .cli import gen_diff_report, json_float
-from .ocr_files import plain_extract
-from .word_error_rate import word_error_rate_n, words_normalized
+from .cli import check_normalization
+from .config import Config
 
 
 def removesuffix(text, suffix):
@@ -108,6 +104,87 @@ def find_gt_and_ocr_files_autodetect(gt_dir, ocr_dir):
     yield from find_gt_and_ocr_files(gt_dir, gt_suffix, ocr_dir, ocr_suffix)
 
 
+def process_pair(
+    k, gt_fn, ocr_fn, plain_encoding="autodetect", normalization="nfc_sbb"
+):
+    """Compare the k-th pair of GT and OCR line text files.
+
+    normalization is anything get_normalizer() accepts, preferably an already
+    resolved Normalizer.
+
+    :return: CER, number of characters, WER, number of words, the character and
+        word diff reports of the pair and whether its alignments are exact
+    """
+    from .align import Alignment
+    from .character_error_rate import character_error_rate_n
+    from .evaluator import gen_diff_report
+    from .extracted_text import get_normalizer
+    from .ocr_files import plain_extract
+    from .vocabulary import Vocabulary
+    from .word_error_rate import word_error_rate_n
+
+    normalizer = get_normalizer(normalization)
+    gt_text = plain_extract(
+        gt_fn,
+        include_filename_in_id=True,
+        encoding=plain_encoding,
+        normalization=normalizer,
+    )
+    ocr_text = plain_extract(
+        ocr_fn,
+        include_filename_in_id=True,
+        encoding=plain_encoding,
+        normalization=normalizer,
+    )
+    # Align once per level, everything else is derived from the alignments
+    clusters: Vocabulary[str] = Vocabulary()
+    char_alignment = Alignment.from_sequences(
+        gt_text.encode_grapheme_clusters(clusters),
+        ocr_text.encode_grapheme_clusters(clusters),
+    )
+    words: Vocabulary[str] = Vocabulary()
+    gt_words = words.encode(gt_text.words)
+    ocr_words = words.encode(ocr_text.words)
+    word_alignment = Alignment.from_sequences(gt_words, ocr_words)
+
+    l_cer, l_n_characters = character_error_rate_n(char_alignment)
+    l_wer, l_n_words = word_error_rate_n(word_alignment)
+
+    char_diff_report = gen_diff_report(
+        gt_text,
+        ocr_text,
+        css_prefix="l{0}-c".format(k),
+        joiner="",
+        none="·",
+        alignment=char_alignment,
+        vocabulary=clusters,
+    )[0]
+    word_diff_report = gen_diff_report(
+        gt_words,
+        ocr_words,
+        css_prefix="l{0}-w".format(k),
+        joiner=" ",
+        none="⋯",
+        alignment=word_alignment,
+        vocabulary=words,
+    )[0]
+
+    exact = char_alignment.exact and word_alignment.exact
+    return (
+        l_cer,
+        l_n_characters,
+        l_wer,
+        l_n_words,
+        char_diff_report,
+        word_diff_report,
+        exact,
+    )
+
+
+def _process_pair(args):
+    return process_pair(*args)
+
+
 def process(
     gt_dir,
     ocr_dir,
@@ -117,74 +194,91 @@ def process(
     gt_suffix=None,
     ocr_suffix=None,
     plain_encoding="autodetect",
+    normalization="nfc_sbb",
+    jobs=None,
 ):
+    from concurrent.futures import ProcessPoolExecutor
+
+    from .extracted_text import get_normalizer
+    from .templating import template_environment
 
     cer = None
     n_characters = None
-    char_diff_report = ""
+    char_diff_reports = []
     wer = None
     n_words = None
-    word_diff_report = ""
+    word_diff_reports = []
+    exact_alignment = True
 
     if gt_suffix is not None and ocr_suffix is not None:
         gt_ocr_files = find_gt_and_ocr_files(gt_dir, gt_suffix, ocr_dir, ocr_suffix)
     else:
         gt_ocr_files = find_gt_and_ocr_files_autodetect(gt_dir, ocr_dir)
 
-    for k, (gt_fn, ocr_fn) in enumerate(gt_ocr_files):
-        gt_text = plain_extract(
-            gt_fn, include_filename_in_id=True, encoding=plain_encoding
-        )
-        ocr_text = plain_extract(
-            ocr_fn, include_filename_in_id=True, encoding=plain_encoding
-        )
-        gt_words: List[str] = list(words_normalized(gt_text))
-        ocr_words: List[str] = list(words_normalized(ocr_text))
-
-        # Compute CER
-        l_cer, l_n_characters = character_error_rate_n(gt_text, ocr_text)
-        if cer is None:
-            cer, n_characters = l_cer, l_n_characters
+    # Resolve the normalization once, the Normalizer is cheap to pickle for the
+    # workers
+    normalizer = get_normalizer(normalization)
+    pairs = [
+        (k, gt_fn, ocr_fn, plain_encoding, normalizer)
+        for k, (gt_fn, ocr_fn) in enumerate(gt_ocr_files)
+    ]
+
+    # CER, number of characters, WER, number of words, the diff reports and whether
+    # the alignments are exact per pair
+    results: Iterator[Tuple[Any, ...]]
+    with contextlib.ExitStack() as stack:
+        if jobs == 1:
+            results = map(_process_pair, pairs)
         else:
-            # Rolling update
-            cer = (cer * n_characters + l_cer * l_n_characters) / (
-                n_characters + l_n_characters
+            workers = jobs or os.cpu_count() or 1
+            executor = stack.enter_context(
+                ProcessPoolExecutor(
+                    max_workers=workers,
+                    initializer=Config.set_state,
+                    initargs=(Config.get_state(),),
+                )
             )
-            n_characters = n_characters + l_n_characters
-
-        # Compute WER
-        l_wer, l_n_words = word_error_rate_n(gt_words, ocr_words)
-        if wer is None:
-            wer, n_words = l_wer, l_n_words
-        else:
-            # Rolling update
-            wer = (wer * n_words + l_wer * l_n_words) / (n_words + l_n_words)
-            n_words = n_words + l_n_words
-
-        # Generate diff reports
-        char_diff_report += gen_diff_report(
-            gt_text,
-            ocr_text,
-            css_prefix="l{0}-c".format(k),
-            joiner="",
-            none="·",
-            score_hint=score_hint(l_cer, l_n_characters),
-        )[0]
-        word_diff_report += gen_diff_report(
-            gt_words,
-            ocr_words,
-            css_prefix="l{0}-w".format(k),
-            joiner=" ",
-            none="⋯",
-            score_hint=score_hint(l_wer, l_n_words),
-        )[0]
-
-    env = Environment(
-        loader=FileSystemLoader(
-            os.path.join(os.path.dirname(os.path.realpath(__file__)), "templates")
-        )
-    )
-    env.filters["json_float"] = json_float
+            # The work per pair is small, so send it to the workers in chunks to
+            # reduce the overhead. map() yields the results in the original order.
+            chunksize = max(1, len(pairs) // (workers * 4))
+            results = executor.map(_process_pair, pairs, chunksize=chunksize)
+
+        for (
+            l_cer,
+            l_n_characters,
+            l_wer,
+            l_n_words,
+            char_diff_report,
+            word_diff_report,
+            exact,
+        ) in results:
+            # Compute CER
+            if cer is None:
+                cer, n_characters = l_cer, l_n_characters
+            else:
+                # Rolling update
+                cer = (cer * n_characters + l_cer * l_n_characters) / (
+                    n_characters + l_n_characters
+                )
+                n_characters = n_characters + l_n_characters
+
+            # Compute WER
+            if wer is None:
+                wer, n_words = l_wer, l_n_words
+            else:
+                # Rolling update
+                wer = (wer * n_words + l_wer * l_n_words) / (n_words + l_n_words)
+                n_words = n_words + l_n_words
+
+            # Collect diff reports
+            char_diff_reports.append(char_diff_report)
+            word_diff_reports.append(word_diff_report)
+            exact_alignment = exact_alignment and exact
+
+    char_diff_report = "".join(char_diff_reports)
+    word_diff_report = "".join(word_diff_reports)
+
+    env = template_environment()
 
     for report_suffix in (".html", ".json"):
         template_fn = "report" + report_suffix + ".j2"
@@ -200,6 +294,7 @@ def process(
             n_words=n_words,
             char_diff_report=char_diff_report,
             word_diff_report=word_diff_report,
+            exact_alignment=exact_alignment,
             metrics=metrics,
         ).dump(out_fn)
 
@@ -218,7 +313,31 @@ def process(
     default="autodetect",
     help='Encoding (e.g. "utf-8") of plain text files',
 )
-def main(gt, ocr, report_prefix, metrics, gt_suffix, ocr_suffix, plain_encoding):
+@click.option(
+    "--normalization",
+    default="nfc_sbb",
+    callback=check_normalization,
+    help='Normalization profile, "nfc", "nfc_sbb" or the path of a JSON profile file',
+    metavar="PROFILE",
+)
+@click.option(
+    "--jobs",
+    "-j",
+    type=click.IntRange(min=1),
+    default=None,
+    help="Number of processes to compare the lines with (default: number of CPUs)",
+)
+def main(
+    gt,
+    ocr,
+    report_prefix,
+    metrics,
+    gt_suffix,
+    ocr_suffix,
+    plain_encoding,
+    normalization,
+    jobs,
+):
     """
     Compare the GT line text directory against the OCR line text directory.
 
@@ -245,7 +364,12 @@ def main(gt, ocr, report_prefix, metrics, gt_suffix, ocr_suffix, plain_encoding)
 
     It is recommended to specify the encoding of the text files, for example with
     --plain-encoding utf-8. If this option is not given, we try to auto-detect it.
+
+    The line pairs are compared in parallel using --jobs processes. The report is the
+    same as when comparing them one after the other.
     """
+    from ocrd_utils import initLogging
+
     initLogging()
     process(
         gt,
@@ -255,6 +379,8 @@ def main(gt, ocr, report_prefix, metrics, gt_suffix, ocr_suffix, plain_encoding)
         gt_suffix=gt_suffix,
         ocr_suffix=ocr_suffix,
         plain_encoding=plain_encoding,
+        normalization=normalization,
+        jobs=jobs,
     )
 
 
@@ -3,13 +3,11 @@ import os
 from typing import Dict
 
 import click
-from jinja2 import Environment, FileSystemLoader
-from ocrd_utils import initLogging
-
-from dinglehopper.cli import json_float
 
 
 def process(reports_folder, occurrences_threshold=1):
+    from dinglehopper.templating import template_environment
+
     cer_list = []
     wer_list = []
     cer_sum = 0
@@ -58,12 +56,7 @@ def process(reports_folder, occurrences_threshold=1):
     print(f"Sum of common mistakes: {cer_sum}")
     print(f"Sum of common mistakes: {wer_sum}")
 
-    env = Environment(
-        loader=FileSystemLoader(
-            os.path.join(os.path.dirname(os.path.realpath(__file__)), "templates")
-        )
-    )
-    env.filters["json_float"] = json_float
+    env = template_environment()
     for report_suffix in (".html", ".json"):
         template_fn = "summary" + report_suffix + ".j2"
 
@@ -99,6 +92,8 @@ def main(reports_folder, occurrences_threshold):
 
     All JSON files in the provided folder will be gathered and summarized.
     """
+    from ocrd_utils import initLogging
+
     initLogging()
     process(reports_folder, occurrences_threshold)
 
@@ -1,2 +1,38 @@
+from typing import Any, Dict
+
+
 class Config:
     progress = False
+
+    # Alignments with more DP matrix cells (= product of the sequence lengths) than
+    # this are computed in linear memory, see align.linear_memory_editops(). RapidFuzz
+    # needs one bit per cell at most, so this also bounds its memory use.
+    alignment_max_cells = 10**10
+
+    # Align using anchors (unique k-grams), see align.anchored_editops(). This is much
+    # faster for long documents, but the alignment is not guaranteed to be optimal.
+    anchored_alignment = False
+
+    # Cache the extracted GT in this directory (None: no cache), removing the least
+    # recently used entries when the cache is larger than extraction_cache_size bytes
+    extraction_cache_dir = None
+    extraction_cache_size = 2**30
+
+    @classmethod
+    def get_state(cls) -> Dict[str, Any]:
+        """Return the settings, e.g. to pass them to worker processes.
+
+        Worker processes only inherit the settings if they are forked, see
+        set_state().
+        """
+        return {
+            name: value
+            for name, value in vars(cls).items()
+            if not name.startswith("_") and not isinstance(value, classmethod)
+        }
+
+    @classmethod
+    def set_state(cls, state: Dict[str, Any]) -> None:
+        """Set the settings returned by get_state(), e.g. as a pool initializer."""
+        for name, value in state.items():
+            setattr(cls, name, value)
@@ -1,11 +1,14 @@
 import unicodedata
-from typing import List
+from typing import List, Sequence
 
+import numpy as np
 from multimethod import multimethod
+from rapidfuzz import process
 from rapidfuzz.distance import Levenshtein
-from uniseg.graphemecluster import grapheme_clusters
 
 from .extracted_text import ExtractedText
+from .graphemes import grapheme_clusters
+from .vocabulary import Vocabulary
 
 
 @multimethod
@@ -27,14 +30,35 @@ def _(s1: str, s2: str) -> int:
     normalization and grapheme clusters. This should be the correct way to compare two
     Unicode strings.
     """
-    seq1 = list(grapheme_clusters(unicodedata.normalize("NFC", s1)))
-    seq2 = list(grapheme_clusters(unicodedata.normalize("NFC", s2)))
+    seq1 = grapheme_clusters(unicodedata.normalize("NFC", s1))
+    seq2 = grapheme_clusters(unicodedata.normalize("NFC", s2))
     return Levenshtein.distance(seq1, seq2)
 
 
 @distance.register
 def _(s1: ExtractedText, s2: ExtractedText) -> int:
-    return Levenshtein.distance(s1.grapheme_clusters, s2.grapheme_clusters)
+    # Compare the grapheme clusters as integer codes of a vocabulary of this call
+    vocabulary: Vocabulary[str] = Vocabulary()
+    return Levenshtein.distance(
+        s1.encode_grapheme_clusters(vocabulary),
+        s2.encode_grapheme_clusters(vocabulary),
+    )
+
+
+def distance_batch(
+    seqs1: Sequence[Sequence], seqs2: Sequence[Sequence], *, workers: int = -1
+) -> np.ndarray:
+    """Compute the Levenshtein edit distances between many pairs of sequences.
+
+    seqs1[i] is compared with seqs2[i]. The distances are computed by RapidFuzz in
+    the given number of threads (-1: all CPUs), without a Python call per pair.
+    Pass integer-encoded sequences (see Vocabulary) for best performance.
+    """
+    if len(seqs1) != len(seqs2):
+        raise ValueError("Both batches must contain the same number of sequences")
+    return process.cpdist(
+        seqs1, seqs2, scorer=Levenshtein.distance, dtype=np.int64, workers=workers
+    )
 
 
 def editops(word1, word2):
@@ -43,6 +67,6 @@ def editops(word1, word2):
 
     Note that this returns indices to the _grapheme clusters_, not characters!
     """
-    word1 = list(grapheme_clusters(unicodedata.normalize("NFC", word1)))
-    word2 = list(grapheme_clusters(unicodedata.normalize("NFC", word2)))
+    word1 = grapheme_clusters(unicodedata.normalize("NFC", word1))
+    word2 = grapheme_clusters(unicodedata.normalize("NFC", word2))
     return Levenshtein.editops(word1, word2).as_list()
@@ -0,0 +1,323 @@
+import os
+from collections import Counter
+from itertools import repeat
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence
+
+import attr
+from jinja2 import Template
+from markupsafe import escape
+
+from .align import Alignment
+from .cache import ExtractionCache
+from .extracted_text import ExtractedText, get_normalizer
+from .ocr_files import extract
+from .templating import json_float, template_environment  # noqa: F401
+from .vocabulary import Vocabulary
+
+
+def gen_diff_report(
+    gt_in,
+    ocr_in,
+    css_prefix,
+    joiner,
+    none,
+    *,
+    differences=False,
+    score_hint=None,
+    alignment=None,
+    vocabulary=None,
+):
+    """Generate the HTML diff report and count the differences.
+
+    If a Vocabulary is given, gt_in and ocr_in are sequences of its codes, e.g. the
+    word codes of ExtractedText. The differences are counted by code and only
+    decoded for the report. For ExtractedText, the grapheme clusters are encoded
+    with the given Vocabulary, or with a Vocabulary of this call.
+
+    If an Alignment of gt_in and ocr_in (or of their grapheme cluster codes, for
+    ExtractedText, together with their Vocabulary) is given, it is used instead of
+    aligning again.
+    """
+    gtx = []
+    ocrx = []
+
+    def format_thing(t, css_classes=None, id_=None):
+        if t is None:
+            html_t = none
+            css_classes += " ellipsis"
+        elif t == "\n":
+            html_t = "<br>"
+        else:
+            html_t = escape(t)
+
+        html_custom_attrs = ""
+
+        # Set Bootstrap tooltip to the segment id
+        if id_:
+            html_custom_attrs += f'data-toggle="tooltip" title="{id_}"'
+
+        if css_classes:
+            return f'<span class="{css_classes}" {html_custom_attrs}>{html_t}</span>'
+        else:
+            return f"{html_t}"
+
+    def format_equal(things):
+        """Format a block of equal things, which need no markup."""
+        if joiner == "":
+            # "\r\n" is the only grapheme cluster containing a "\n" that is not "\n"
+            # itself, so we can escape the whole block at once otherwise.
+            t = "".join(things)
+            if "\r\n" not in t:
+                return str(escape(t)).replace("\n", "<br>")
+        return "".join(joiner + format_thing(t) for t in things)
+
+    if isinstance(gt_in, ExtractedText):
+        if not isinstance(ocr_in, ExtractedText):
+            raise TypeError()
+        # Align the integer-encoded grapheme clusters and decode them for the report.
+        # A given alignment already is of the codes.
+        if vocabulary is None:
+            if alignment is not None:
+                raise ValueError("An alignment of codes requires their Vocabulary")
+            vocabulary = Vocabulary()
+        if alignment is None:
+            alignment = Alignment.from_sequences(
+                gt_in.encode_grapheme_clusters(vocabulary),
+                ocr_in.encode_grapheme_clusters(vocabulary),
+                score_hint,
+            )
+    elif alignment is None:
+        alignment = Alignment.from_sequences(gt_in, ocr_in, score_hint)
+
+    decode: Optional[Callable[[Iterable[int]], List[Any]]] = None
+    item: Optional[Callable[[Optional[int]], Any]] = None
+    if vocabulary is not None:
+        decode = vocabulary.decode
+
+        def item_or_none(code: Optional[int]) -> Any:
+            return None if code is None else vocabulary.item(code)
+
+        item = item_or_none
+
+    if isinstance(gt_in, ExtractedText):
+        # Look up the segment ids for all differences at once. Deletions and inserts
+        # only produce one id + None, UI must support this, i.e. display for the one
+        # id produced
+        gt_positions: List[int] = []
+        ocr_positions: List[int] = []
+        for tag, i1, i2, j1, j2 in alignment.opcodes:
+            if tag != "equal":
+                gt_positions.extend(range(i1, i2))
+                ocr_positions.extend(range(j1, j2))
+        gt_ids = iter(gt_in.segment_ids_for_cluster_positions(gt_positions))
+        ocr_ids = iter(ocr_in.segment_ids_for_cluster_positions(ocr_positions))
+    else:
+        gt_ids = ocr_ids = repeat(None)
+
+    k = 0
+    found_differences = []
+
+    for tag, gt_block, ocr_block in alignment.blocks():
+        if tag == "equal":
+            if decode is not None:
+                gt_block = decode(gt_block)
+            html = format_equal(gt_block)
+            gtx.append(html)
+            ocrx.append(html)
+            k += len(gt_block)
+            continue
+
+        if tag == "insert":
+            pairs = zip(repeat(None), ocr_block)
+        elif tag == "delete":
+            pairs = zip(gt_block, repeat(None))
+        else:
+            pairs = zip(gt_block, ocr_block)
+
+        for g, o in pairs:
+            css_classes = "{css_prefix}diff{k} diff".format(css_prefix=css_prefix, k=k)
+            gt_id = next(gt_ids) if g is not None else None
+            ocr_id = next(ocr_ids) if o is not None else None
+
+            if differences:
+                found_differences.append((g, o))
+            if item is not None:
+                g, o = item(g), item(o)
+
+            gtx.append(joiner + format_thing(g, css_classes, gt_id))
+            ocrx.append(joiner + format_thing(o, css_classes, ocr_id))
+            k += 1
+
+    counted_differences: Dict[str, int] = {}
+    for (g, o), count in Counter(found_differences).items():
+        if item is not None:
+            g, o = item(g), item(o)
+        key = f"{g} :: {o}"
+        counted_differences[key] = counted_differences.get(key, 0) + count
+
+    return (
+        """
+        <div class="row">
+           <div class="col-md-6 gt">{}</div>
+           <div class="col-md-6 ocr">{}</div>
+        </div>
+        """.format(
+            "".join(gtx), "".join(ocrx)
+        ),
+        counted_differences,
+    )
+
+
+@attr.s(frozen=True)
+class Result:
+    """The metrics and diff reports of an evaluation, see Evaluator."""
+
+    gt = attr.ib(type=str)
+    ocr = attr.ib(type=str)
+    cer = attr.ib(type=float)
+    n_characters = attr.ib(type=int)
+    wer = attr.ib(type=float)
+    n_words = attr.ib(type=int)
+    char_diff_report = attr.ib(type=str)
+    word_diff_report = attr.ib(type=str)
+    diff_c = attr.ib(type=Dict[str, int])
+    diff_w = attr.ib(type=Dict[str, int])
+    # False if an alignment is not guaranteed to be optimal, see Alignment.exact
+    exact_alignment = attr.ib(type=bool, default=True)
+
+
+class Evaluator:
+    """
+    Evaluate OCR results against GT, e.g. in a long-running service.
+
+    The configuration is given once. The normalization profile is resolved and the
+    report templates are compiled when the Evaluator is created, and evaluate()
+    does no further setup. An Evaluator may be shared by several threads.
+    """
+
+    def __init__(
+        self,
+        *,
+        metrics: bool = True,
+        differences: bool = False,
+        textequiv_level: str = "region",
+        plain_encoding: str = "autodetect",
+        normalization: Any = "nfc_sbb",
+        formats: Sequence[str] = ("html", "json"),
+        cache: Optional[ExtractionCache] = None,
+    ) -> None:
+        """
+        :param normalization: a normalization profile, see get_normalizer()
+        :param formats: the report formats, see write_reports()
+        :param cache: the extraction cache for the GT
+        """
+        self.metrics = metrics
+        self.differences = differences
+        self.textequiv_level = textequiv_level
+        self.plain_encoding = plain_encoding
+        self.normalizer = get_normalizer(normalization)
+        self.cache = cache
+        env = template_environment()
+        self._templates: Dict[str, Template] = {
+            fmt: env.get_template(f"report.{fmt}.j2") for fmt in formats
+        }
+
+    def extract(self, filename: str, *, cache: bool = False) -> ExtractedText:
+        """Extract the normalized text of the given file, using the cache if asked."""
+        return extract(
+            filename,
+            textequiv_level=self.textequiv_level,
+            plain_encoding=self.plain_encoding,
+            normalization=self.normalizer,
+            cache=self.cache if cache else None,
+        )
+
+    def evaluate(self, gt: str, ocr: str) -> Result:
+        """Evaluate the OCR result file ocr against the GT file gt."""
+        return self.compare(self.extract(gt, cache=True), self.extract(ocr), gt, ocr)
+
+    def compare(
+        self,
+        gt_text: ExtractedText,
+        ocr_text: ExtractedText,
+        gt: str = "",
+        ocr: str = "",
+    ) -> Result:
+        """Compare the extracted texts, gt and ocr name them in the reports.
+
+        The encoding of the GT is cached (see ExtractedText.encoded), so comparing
+        the same GT with several OCR texts only encodes it once.
+        """
+        # The OCR text is encoded with copies of the GT's vocabularies, so they do not
+        # grow with every OCR text compared.
+        gt_encoded = gt_text.encoded
+        ocr_encoded = gt_encoded.encode_other(ocr_text)
+
+        # Align once per level, the error rates and diff reports are derived from the
+        # alignments.
+        char_alignment = Alignment.from_sequences(
+            gt_encoded.cluster_codes, ocr_encoded.cluster_codes
+        )
+        cer, n_characters = char_alignment.error_rate_n()
+        char_diff_report, diff_c = gen_diff_report(
+            gt_text,
+            ocr_text,
+            css_prefix="c",
+            joiner="",
+            none="·",
+            differences=self.differences,
+            alignment=char_alignment,
+            vocabulary=ocr_encoded.clusters,
+        )
+
+        word_alignment = Alignment.from_sequences(
+            gt_encoded.word_codes, ocr_encoded.word_codes
+        )
+        wer, n_words = word_alignment.error_rate_n()
+        word_diff_report, diff_w = gen_diff_report(
+            gt_encoded.word_codes,
+            ocr_encoded.word_codes,
+            css_prefix="w",
+            joiner=" ",
+            none="⋯",
+            differences=self.differences,
+            alignment=word_alignment,
+            vocabulary=ocr_encoded.words,
+        )
+
+        return Result(
+            gt=gt,
+            ocr=ocr,
+            cer=cer,
+            n_characters=n_characters,
+            wer=wer,
+            n_words=n_words,
+            char_diff_report=char_diff_report,
+            word_diff_report=word_diff_report,
+            diff_c=diff_c,
+            diff_w=diff_w,
+            exact_alignment=char_alignment.exact and word_alignment.exact,
+        )
+
+    def render(self, result: Result, fmt: str) -> str:
+        """Render the report of the result in the given format, e.g. "html"."""
+        rendered: str = self._templates[fmt].render(**self._context(result))
+        return rendered
+
+    def write_reports(
+        self, result: Result, report_prefix: str, reports_folder: str = "."
+    ) -> None:
+        """Write the reports to $reports_folder/$report_prefix.$format."""
+        # Parallel processes may create the folder at the same time
+        os.makedirs(reports_folder, exist_ok=True)
+        context = self._context(result)
+        for fmt, template in self._templates.items():
+            out_fn = os.path.join(reports_folder, f"{report_prefix}.{fmt}")
+            template.stream(**context).dump(out_fn)
+
+    def _context(self, result: Result) -> Dict[str, Any]:
+        return dict(
+            attr.asdict(result, recurse=False),
+            metrics=self.metrics,
+            differences=self.differences,
+        )
@@ -1,16 +1,19 @@
 import enum
 import functools
+import logging
 import re
 import unicodedata
+from array import array
+from bisect import bisect_right
 from contextlib import suppress
-from itertools import repeat
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
 
 import attr
-import numpy as np
 from lxml import etree as ET
-from ocrd_utils import getLogger
-from uniseg.graphemecluster import grapheme_clusters
+
+from .graphemes import grapheme_clusters
+from .normalization import Normalizer, load_profile
+from .vocabulary import Vocabulary
 
 
 class Normalization(enum.Enum):
@@ -19,15 +22,30 @@ class Normalization(enum.Enum):
     NFC_SBB = 3
 
 
-def normalize(text, normalization):
-    if normalization == Normalization.NFC:
-        return unicodedata.normalize("NFC", text)
+def get_normalizer(normalization: Any) -> Normalizer:
+    """
+    Return the Normalizer for the given normalization.
+
+    normalization is a Normalization, the name of a normalization profile included
+    with dinglehopper (e.g. "nfc_sbb"), the path of a profile file or a Normalizer.
+    """
+    if isinstance(normalization, Normalizer):
+        return normalization
+    if isinstance(normalization, str):
+        return load_profile(normalization)
+    normalization = Normalization(normalization)
     if normalization == Normalization.NFC_MUFI:
         raise NotImplementedError()
-    if normalization == Normalization.NFC_SBB:
-        return substitute_equivalences(text)
-    else:
-        raise ValueError()
+    return load_profile(normalization.name.lower())
+
+
+def normalize(text, normalization):
+    return get_normalizer(normalization)(text)
+
+
+def is_normalized(text, normalization):
+    """Check if text is normalized, usually without building a normalized copy."""
+    return get_normalizer(normalization).is_normalized(text)
 
 
 # XXX hack
@@ -35,62 +53,23 @@ def normalize_sbb(t):
     return normalize(t, Normalization.NFC_SBB)
 
 
+@functools.lru_cache(maxsize=None)
+def _unjoin_ligatures() -> Normalizer:
+    # The first phase of the SBB profile unjoins the ligatures
+    return Normalizer([get_normalizer(Normalization.NFC_SBB).phases[0].rules])
+
+
 def unjoin_ligatures(s):
     """Unjoin ligatures, i.e. ﬀ becomes ff."""
-
-    equivalences = {
-        "": "ſſ",
-        "\ueba7": "ſſi",  # MUFI: LATIN SMALL LIGATURE LONG S LONG S I
-        "": "ch",
-        "": "ck",
-        "": "ll",
-        "": "ſi",
-        "": "ſt",
-        "ﬁ": "fi",
-        "ﬀ": "ff",
-        "ﬂ": "fl",
-        "ﬃ": "ffi",
-        "": "ct",
-        "": "tz",  # MUFI: LATIN SMALL LIGATURE TZ
-        "\uf532": "as",  # eMOP: Latin small ligature as
-        "\uf533": "is",  # eMOP: Latin small ligature is
-        "\uf534": "us",  # eMOP: Latin small ligature us
-        "\uf535": "Qu",  # eMOP: Latin ligature capital Q small u
-        "ĳ": "ij",  # U+0133 LATIN SMALL LIGATURE IJ
-        "\uE8BF": "q&",
-        # MUFI: LATIN SMALL LETTER Q LIGATED WITH FINAL ET
-        # XXX How to replace this correctly?
-        "\uEBA5": "ſp",  # MUFI: LATIN SMALL LIGATURE LONG S P
-        "ﬆ": "st",  # U+FB06 LATIN SMALL LIGATURE ST
-    }
-    s = unicodedata.normalize("NFC", s)
-    for fr, to in equivalences.items():
-        s = s.replace(fr, to)
-    return s
+    return _unjoin_ligatures()(s)
 
 
 def substitute_equivalences(s):
-    # These are for OCR-D GT vs Tesseract frk vs Calamari GT4HistOCR
-    # It might make sense to use different rules for GT and for the different OCR
-    equivalences = {
-        "": "ü",
-        "": "ä",
-        "==": "–",  # → en-dash
-        "—": "–",  # em-dash → en-dash
-        "": "ö",
-        "’": "'",
-        "⸗": "-",
-        "aͤ": "ä",  # LATIN SMALL LETTER A, COMBINING LATIN SMALL LETTER E
-        "oͤ": "ö",  # LATIN SMALL LETTER O, COMBINING LATIN SMALL LETTER E
-        "uͤ": "ü",  # LATIN SMALL LETTER U, COMBINING LATIN SMALL LETTER E
-        "\uF50E": "q́",  # U+F50E LATIN SMALL LETTER Q WITH ACUTE ACCENT
-    }
-
-    s = unicodedata.normalize("NFC", s)
-    s = unjoin_ligatures(s)
-    for fr, to in equivalences.items():
-        s = s.replace(fr, to)
-    return s
+    return normalize(s, Normalization.NFC_SBB)
+
+
+def _optional_list(value: Optional[Iterable[str]]) -> Optional[List[str]]:
+    return None if value is None else list(value)
 
 
 @attr.s(frozen=True)
@@ -135,7 +114,7 @@ class ExtractedText:
     segments = attr.ib(type=Optional[List["ExtractedText"]])
     joiner = attr.ib(type=Optional[str])
     _text = attr.ib(type=Optional[str])
-    _grapheme_clusters = attr.ib(type=Optional[List[str]])
+    _grapheme_clusters = attr.ib(type=Optional[List[str]], converter=_optional_list)
 
     @segments.validator
     def cant_set_both_segments_and_text(self, _, value):
@@ -158,9 +137,9 @@ class ExtractedText:
 
         if self.segments is not None:
             raise ValueError("Can't have both segments and text")
-        if unicodedata.normalize("NFC", value) != value:
+        if not unicodedata.is_normalized("NFC", value):
             raise ValueError('String "{}" is not in NFC.'.format(value))
-        if normalize(value, self.normalization) != value:
+        if not is_normalized(value, self.normalization):
             raise ValueError('String "{}" is not normalized.'.format(value))
         if self._grapheme_clusters is None:
             raise ValueError("Requires both text and grapheme clusters to be set")
@@ -170,15 +149,14 @@ class ExtractedText:
         if value is not None and self._text is None:
             raise ValueError("Requires both text and grapheme clusters to be set")
 
-    normalization = attr.ib(converter=Normalization, default=Normalization.NFC_SBB)
+    normalization = attr.ib(converter=get_normalizer, default=Normalization.NFC_SBB)
 
     @property
     def text(self) -> str:
         if self._text is not None:
             return self._text
         else:
-            assert self.joiner is not None and self.segments is not None
-            return self.joiner.join(s.text for s in self.segments)
+            return self._flattened.text
 
     @functools.cached_property
     def _joiner_grapheme_cluster(self):
@@ -189,7 +167,7 @@ class ExtractedText:
 
         assert self.joiner is not None
         if len(self.joiner) > 0:
-            joiner_grapheme_cluster = list(grapheme_clusters(self.joiner))
+            joiner_grapheme_cluster = grapheme_clusters(self.joiner)
             assert len(joiner_grapheme_cluster) == 1  # see joiner's check above
         elif len(self.joiner) == 0:
             joiner_grapheme_cluster = []
@@ -199,43 +177,181 @@ class ExtractedText:
         return joiner_grapheme_cluster
 
     @property
-    def grapheme_clusters(self):
+    def grapheme_clusters(self) -> List[str]:
+        """The grapheme clusters of the text.
+
+        For segmented texts, the list is built from the segments on every access.
+        Use encode_grapheme_clusters() to compare texts.
+        """
         if self._text is not None:
+            assert self._grapheme_clusters is not None
             return self._grapheme_clusters
         else:
-            # TODO Test with text extracted at glyph level (joiner == "")
-            clusters = []
-            assert self.segments is not None
-            for seg in self.segments:
-                clusters += seg.grapheme_clusters + self._joiner_grapheme_cluster
-            clusters = clusters[:-1]
-            return clusters
-
-    _segment_id_for_pos = None
-
-    def segment_id_for_pos(self, pos):
-        # Calculate segment ids once, on the first call
-        if not self._segment_id_for_pos:
-            if self._text is not None:
-                segment_id_for_pos = list(repeat(self.segment_id, len(self._text)))
+            return list(self._iter_grapheme_clusters())
+
+    def _iter_grapheme_clusters(self) -> Iterator[str]:
+        if self._text is not None:
+            assert self._grapheme_clusters is not None
+            yield from self._grapheme_clusters
+        else:
+            assert self.joiner is not None and self.segments is not None
+            for i, seg in enumerate(self.segments):
+                if i > 0:
+                    yield from self._joiner_grapheme_cluster
+                yield from seg._iter_grapheme_clusters()
+
+    @functools.cached_property
+    def _flattened(self) -> "FlattenedText":
+        """The text of all segments, joined, and the offsets of the segments.
+
+        This is computed in one pass over the segment hierarchy. This property is
+        cached.
+        """
+        texts: List[str] = []
+        segment_ids: List[Optional[str]] = []
+        text_starts, text_ends = array("q"), array("q")
+        cluster_starts, cluster_ends = array("q"), array("q")
+
+        def flatten(
+            et: ExtractedText, text_pos: int, cluster_pos: int
+        ) -> Tuple[int, int]:
+            if et._text is not None:
+                assert et._grapheme_clusters is not None
+                segment_ids.append(et.segment_id)
+                text_starts.append(text_pos)
+                cluster_starts.append(cluster_pos)
+                texts.append(et._text)
+                text_pos += len(et._text)
+                cluster_pos += len(et._grapheme_clusters)
+                text_ends.append(text_pos)
+                cluster_ends.append(cluster_pos)
             else:
-                # Recurse
-                segment_id_for_pos = []
-                assert self.joiner is not None and self.segments is not None
-                for s in self.segments:
-                    seg_ids = [s.segment_id_for_pos(i) for i in range(len(s.text))]
-                    segment_id_for_pos.extend(seg_ids)
-                    segment_id_for_pos.extend(repeat(None, len(self.joiner)))
-                segment_id_for_pos = segment_id_for_pos[: -len(self.joiner)]
+                assert et.joiner is not None and et.segments is not None
+                for i, seg in enumerate(et.segments):
+                    if i > 0:
+                        texts.append(et.joiner)
+                        text_pos += len(et.joiner)
+                        cluster_pos += len(et._joiner_grapheme_cluster)
+                    text_pos, cluster_pos = flatten(seg, text_pos, cluster_pos)
+            return text_pos, cluster_pos
+
+        flatten(self, 0, 0)
+        return FlattenedText(
+            "".join(texts),
+            segment_ids,
+            text_starts,
+            text_ends,
+            cluster_starts,
+            cluster_ends,
+        )
+
+    def encode_grapheme_clusters(self, vocabulary: Vocabulary[str]) -> array:
+        """Encode the grapheme clusters using the given vocabulary.
+
+        The codes are built in one pass over the segments, without building the list
+        of all grapheme clusters.
+        """
+        if self._text is not None:
+            assert self._grapheme_clusters is not None
+            return vocabulary.encode(self._grapheme_clusters)
+        codes = array("I")
+        self._encode_grapheme_clusters_into(vocabulary, codes)
+        return codes
+
+    def _encode_grapheme_clusters_into(
+        self, vocabulary: Vocabulary[str], codes: array
+    ) -> None:
+        if self._text is not None:
+            assert self._grapheme_clusters is not None
+            codes.extend(vocabulary.encode(self._grapheme_clusters))
+        else:
+            assert self.joiner is not None and self.segments is not None
+            joiner_codes = vocabulary.encode(self._joiner_grapheme_cluster)
+            for i, seg in enumerate(self.segments):
+                if i > 0:
+                    codes.extend(joiner_codes)
+                seg._encode_grapheme_clusters_into(vocabulary, codes)
+
+    @functools.cached_property
+    def words(self) -> List[str]:
+        """The words of the text, see word_error_rate.words().
 
-            # This is frozen, so we have to jump through the hoop:
-            object.__setattr__(self, "_segment_id_for_pos", segment_id_for_pos)
-            assert self._segment_id_for_pos
+        This property is cached.
+        """
+        # word_error_rate imports this module
+        from .word_error_rate import words_normalized
 
-        return self._segment_id_for_pos[pos]
+        return list(words_normalized(self.text))
+
+    @functools.cached_property
+    def encoded(self) -> "EncodedText":
+        """The grapheme clusters and words, encoded with vocabularies of their own.
+
+        Compare other texts with this one by encoding them with
+        EncodedText.encode_other(). This property is cached, but not pickled.
+        """
+        return EncodedText.from_text(self, Vocabulary(), Vocabulary())
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # Vocabularies hold a lock, and encoding is cheaper than pickling anyway
+        state = self.__dict__.copy()
+        state.pop("encoded", None)
+        return state
+
+    def segment_id_for_pos(self, pos: int) -> Optional[str]:
+        """Return the id of the text segment at the given code point position.
+
+        Returns None if the position is in a joiner.
+        """
+        if self._text is not None:
+            return self.segment_id
+        f = self._flattened
+        return _segment_id_for(pos, f.segment_ids, f.text_starts, f.text_ends)
+
+    def segment_id_for_cluster_pos(self, pos: int) -> Optional[str]:
+        """Return the id of the text segment at the given grapheme cluster position.
+
+        Returns None if the position is in a joiner.
+        """
+        if self._text is not None:
+            return self.segment_id
+        f = self._flattened
+        return _segment_id_for(pos, f.segment_ids, f.cluster_starts, f.cluster_ends)
+
+    def segment_ids_for_cluster_positions(
+        self, positions: Sequence[int]
+    ) -> List[Optional[str]]:
+        """Return the ids of the text segments at the given grapheme cluster positions.
+
+        This is the batched version of segment_id_for_cluster_pos().
+        """
+        if self._text is not None:
+            return [self.segment_id] * len(positions)
+        f = self._flattened
+        if not f.segment_ids:
+            return [None] * len(positions)
+
+        import numpy as np
+
+        position_array = np.asarray(positions, dtype=np.int64)
+        starts = np.frombuffer(f.cluster_starts, dtype=np.int64)
+        ends = np.frombuffer(f.cluster_ends, dtype=np.int64)
+        indices = np.searchsorted(starts, position_array, side="right") - 1
+        in_segment = (indices >= 0) & (position_array < ends[indices.clip(0)])
+        return [
+            f.segment_ids[i] if found else None
+            for i, found in zip(indices.tolist(), in_segment.tolist())
+        ]
 
     @classmethod
-    def from_text_segment(cls, text_segment, nsmap, *, textequiv_level="region"):
+    def from_text_segment(
+        cls,
+        text_segment,
+        nsmap,
+        *,
+        textequiv_level="region",
+        normalization=Normalization.NFC_SBB,
+    ):
         """Build an ExtractedText from a PAGE content text element"""
 
         localname_for_textequiv_level = {"region": "TextRegion", "line": "TextLine"}
@@ -243,17 +359,19 @@ class ExtractedText:
         children_for_localname = {"TextRegion": "TextLine"}
         joiner_for_textequiv_level = {"line": "\n"}
 
+        normalizer = get_normalizer(normalization)
         segment_id = text_segment.attrib["id"]
         localname = ET.QName(text_segment).localname
         if localname == localname_for_textequiv_level[textequiv_level]:
             segment_text = None
             with suppress(AttributeError):
                 segment_text = get_textequiv_unicode(text_segment, nsmap)
-                # FIXME hardcoded SBB normalization
-                segment_text = normalize_sbb(segment_text)
+                segment_text = normalizer(segment_text)
             segment_text = segment_text or ""
-            clusters = list(grapheme_clusters(segment_text))
-            return cls(segment_id, None, None, segment_text, clusters)
+            clusters = grapheme_clusters(segment_text)
+            return cls(
+                segment_id, None, None, segment_text, clusters, normalization=normalizer
+            )
         else:
             # Recurse
             sub_localname = children_for_localname[localname]
@@ -264,20 +382,86 @@ class ExtractedText:
             ):
                 segments.append(
                     ExtractedText.from_text_segment(
-                        sub_segment, nsmap, textequiv_level=sub_textequiv_level
+                        sub_segment,
+                        nsmap,
+                        textequiv_level=sub_textequiv_level,
+                        normalization=normalizer,
                     )
                 )
             joiner = joiner_for_textequiv_level[sub_textequiv_level]
-            return cls(segment_id, segments, joiner, None, None)
+            return cls(
+                segment_id, segments, joiner, None, None, normalization=normalizer
+            )
 
     @classmethod
     def from_str(cls, text, normalization=Normalization.NFC_SBB):
-        normalized_text = normalize(text, normalization)
-        clusters = list(grapheme_clusters(normalized_text))
+        normalizer = get_normalizer(normalization)
+        normalized_text = normalizer(text)
+        clusters = grapheme_clusters(normalized_text)
+        return cls(
+            None, None, None, normalized_text, clusters, normalization=normalizer
+        )
+
+
+@attr.s(frozen=True)
+class FlattenedText:
+    """
+    The flattened text of an ExtractedText.
+
+    This holds the joined text and, for each text segment
+    (the leaves of the segment hierarchy), its segment id and the start and end
+    offsets of its text (in code points) and of its grapheme clusters.
+    """
+
+    text = attr.ib(type=str)
+    segment_ids = attr.ib(type=List[Optional[str]])
+    text_starts = attr.ib(type=array)
+    text_ends = attr.ib(type=array)
+    cluster_starts = attr.ib(type=array)
+    cluster_ends = attr.ib(type=array)
+
+
+@attr.s(frozen=True)
+class EncodedText:
+    """
+    The grapheme clusters and words of an ExtractedText, as integer codes.
+
+    The codes are only comparable to codes of the same vocabularies. Other texts are
+    encoded with copies of them (see encode_other()), so comparing one text with many
+    others does not grow its vocabularies.
+    """
+
+    clusters = attr.ib(type=Vocabulary)
+    cluster_codes = attr.ib(type=array)
+    words = attr.ib(type=Vocabulary)
+    word_codes = attr.ib(type=array)
+
+    @classmethod
+    def from_text(
+        cls, text: ExtractedText, clusters: Vocabulary[str], words: Vocabulary[str]
+    ) -> "EncodedText":
+        """Encode the text with the given vocabularies."""
         return cls(
-            None, None, None, normalized_text, clusters, normalization=normalization
+            clusters,
+            text.encode_grapheme_clusters(clusters),
+            words,
+            words.encode(text.words),
         )
 
+    def encode_other(self, text: ExtractedText) -> "EncodedText":
+        """Encode another text, to compare it with this one."""
+        return EncodedText.from_text(text, self.clusters.copy(), self.words.copy())
+
+
+def _segment_id_for(
+    pos: int, segment_ids: List[Optional[str]], starts: array, ends: array
+) -> Optional[str]:
+    """Look up the segment containing pos in the sorted segment intervals."""
+    i = bisect_right(starts, pos) - 1
+    if i >= 0 and pos < ends[i]:
+        return segment_ids[i]
+    return None
+
 
 def invert_dict(d):
     """Invert the given dict."""
@@ -298,10 +482,13 @@ def get_textequiv_unicode(text_segment: Any, nsmap: Dict[str, str]) -> str:
 
 def get_first_textequiv(textequivs, segment_id):
     """Get the first TextEquiv based on index or conf order if index is not present."""
-    log = getLogger("processor.OcrdDinglehopperEvaluate")
     if len(textequivs) == 1:
         return textequivs[0]
 
+    import numpy as np
+
+    log = logging.getLogger("processor.OcrdDinglehopperEvaluate")
+
     # try ordering by index
     indices = np.array([get_attr(te, "index") for te in textequivs], dtype=float)
     nan_mask = np.isnan(indices)
@@ -329,10 +516,10 @@ def get_attr(te: Any, attr_name: str) -> float:
     """Extract the attribute for the given name.
 
     Note: currently only handles numeric values!
-    Other or non existent values are encoded as np.nan.
+    Other or non existent values are encoded as NaN.
     """
     attr_value = te.attrib.get(attr_name)
     try:
         return float(attr_value)
     except TypeError:
-        return np.nan
+        return float("nan")
@@ -0,0 +1,78 @@
+import re
+from typing import List, Set
+
+import uniseg.graphemecluster
+
+# Grapheme cluster break properties of the characters that may form a grapheme cluster
+# with a neighbouring character, see
+# https://www.unicode.org/reports/tr29/#Grapheme_Cluster_Boundary_Rules
+_JOINING_PROPERTIES = frozenset(
+    (
+        "cr",
+        "extend",
+        "zwj",
+        "regionalindicator",
+        "prepend",
+        "spacingmark",
+        "l",
+        "v",
+        "t",
+        "lv",
+        "lvt",
+    )
+)
+
+# The characters we have seen, by whether they may join a neighbouring character
+_simple: Set[str] = set()
+_joining: Set[str] = set()
+
+
+def _classify(chars: Set[str]) -> None:
+    for c in chars - _simple - _joining:
+        # uniseg < 0.9 uses different enum member names, e.g. SPACINGMARK
+        gcb = uniseg.graphemecluster.grapheme_cluster_break(c)
+        if gcb.name.replace("_", "").lower() in _JOINING_PROPERTIES:
+            _joining.add(c)
+        else:
+            _simple.add(c)
+
+
+def grapheme_clusters(s: str) -> List[str]:
+    """
+    Split s into grapheme clusters, following Unicode Standard Annex #29.
+
+    This gives the same result as uniseg.graphemecluster.grapheme_clusters(), but
+    uses uniseg only for the parts of s around characters that may form a grapheme
+    cluster with a neighbouring character, e.g. combining characters. Most texts have
+    none of those, and are just split into code points.
+    """
+    chars = set(s)
+    if not chars <= _simple:
+        _classify(chars)
+        joining = chars & _joining
+        if joining:
+            return _grapheme_clusters_around(s, joining)
+    return list(s)
+
+
+def _grapheme_clusters_around(s: str, joining: Set[str]) -> List[str]:
+    # Between two simple characters, there always is a grapheme cluster boundary. So
+    # we only need uniseg for windows around the runs of joining characters,
+    # including the simple character before and after each run.
+    pattern = "[" + "".join(map(re.escape, sorted(joining))) + "]+"
+
+    clusters: List[str] = []
+    start = end = 0  # The current window
+    for m in re.finditer(pattern, s):
+        window_start = max(m.start() - 1, 0)
+        window_end = min(m.end() + 1, len(s))
+        if window_start < end:
+            # Overlaps the current window
+            end = window_end
+            continue
+        clusters.extend(uniseg.graphemecluster.grapheme_clusters(s[start:end]))
+        clusters.extend(s[end:window_start])
+        start, end = window_start, window_end
+    clusters.extend(uniseg.graphemecluster.grapheme_clusters(s[start:end]))
+    clusters.extend(s[end:])
+    return clusters
@@ -0,0 +1,181 @@
+import functools
+import hashlib
+import json
+import os
+import re
+import unicodedata
+from typing import Any, Dict, Iterable, List, Mapping, Match, Optional, Pattern, Tuple
+
+from importlib_resources import files
+
+
+def _keys_pattern(keys: Iterable[str]) -> Optional[Pattern[str]]:
+    """Compile a pattern matching any of the given keys, preferring longer keys."""
+    keys = sorted(keys, key=len, reverse=True)
+    if not keys:
+        return None
+    return re.compile("|".join(re.escape(k) for k in keys))
+
+
+class _Phase:
+    """
+    Replacement rules that are applied together, in a single pass over the text.
+
+    At every position, the longest matching rule wins. Rules are not applied to the
+    replacements of other rules of the same phase.
+    """
+
+    def __init__(self, rules: Mapping[str, str]) -> None:
+        self.rules: Dict[str, str] = {fr: to for fr, to in rules.items() if fr != to}
+        self._pattern = _keys_pattern(self.rules)
+
+    def _replacement(self, m: Match[str]) -> str:
+        return self.rules[m.group()]
+
+    def __call__(self, s: str) -> str:
+        if self._pattern is None:
+            return s
+        return self._pattern.sub(self._replacement, s)
+
+
+class Normalizer:
+    """
+    Normalize texts using compiled replacement rules.
+
+    The text is first normalized to NFC (if nfc is True), then the phases of
+    replacement rules are applied one after the other. The rules of each phase are
+    applied in a single pass, see _Phase.
+
+    Normalizers are identified by the digest of their rules (or of their profile
+    file), they compare equal if the digests are equal.
+    """
+
+    def __init__(
+        self,
+        phases: Iterable[Mapping[str, str]],
+        nfc: bool = True,
+        *,
+        digest: Optional[str] = None,
+    ) -> None:
+        self.nfc = nfc
+        self.phases = [_Phase(rules) for rules in phases]
+        if digest is None:
+            rules = [phase.rules for phase in self.phases]
+            digest = _digest(json.dumps([nfc, rules]).encode("utf-8"))
+        self.digest = digest
+        # A text that contains none of the keys is not changed by any phase
+        self._any_key = _keys_pattern(
+            {fr for phase in self.phases for fr in phase.rules}
+        )
+
+    def __call__(self, text: str) -> str:
+        if self.nfc:
+            text = unicodedata.normalize("NFC", text)
+        if self._any_key is None or self._any_key.search(text) is None:
+            return text
+        for phase in self.phases:
+            text = phase(text)
+        return text
+
+    def is_normalized(self, text: str) -> bool:
+        """
+        Check if the text is already normalized.
+
+        This is equivalent to self(text) == text, but usually does not need to build
+        a normalized copy of the text.
+        """
+        if self.nfc and not unicodedata.is_normalized("NFC", text):
+            return False
+        if self._any_key is None or self._any_key.search(text) is None:
+            return True
+        return self(text) == text
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, Normalizer):
+            return NotImplemented
+        return self.digest == other.digest
+
+    def __hash__(self) -> int:
+        return hash(self.digest)
+
+    def __repr__(self) -> str:
+        return f"<Normalizer {self.digest[:12]}>"
+
+    def __reduce__(self) -> Tuple[Any, ...]:
+        # Unpickling, e.g. in a worker process, reuses an already compiled Normalizer
+        rules = [phase.rules for phase in self.phases]
+        return _cached_normalizer, (self.digest, rules, self.nfc)
+
+
+def _digest(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+# Compiled normalizers by digest, so every process compiles each profile only once
+_normalizers: Dict[str, Normalizer] = {}
+
+
+def _cached_normalizer(
+    digest: str, phases: List[Dict[str, str]], nfc: bool
+) -> Normalizer:
+    try:
+        return _normalizers[digest]
+    except KeyError:
+        normalizer = Normalizer(phases, nfc, digest=digest)
+        return _normalizers.setdefault(digest, normalizer)
+
+
+def _parse_profile(data: bytes, profile: str) -> Tuple[List[Dict[str, str]], bool]:
+    try:
+        profile_json = json.loads(data)
+        phases = [
+            {rule["from"]: rule["to"] for rule in phase["rules"]}
+            for phase in profile_json["phases"]
+        ]
+        return phases, profile_json.get("nfc", True)
+    except (ValueError, KeyError, TypeError) as e:
+        raise ValueError(f"Malformed normalization profile {profile}") from e
+
+
+def _load_profile_data(data: bytes, profile: str) -> Normalizer:
+    digest = _digest(data)
+    try:
+        return _normalizers[digest]
+    except KeyError:
+        phases, nfc = _parse_profile(data, profile)
+        return _cached_normalizer(digest, phases, nfc)
+
+
+@functools.lru_cache(maxsize=None)
+def builtin_profiles() -> Tuple[str, ...]:
+    """Return the names of the normalization profiles included with dinglehopper."""
+    return tuple(
+        sorted(
+            os.path.splitext(f.name)[0]
+            for f in files(__package__).joinpath("profiles").iterdir()
+            if f.name.endswith(".json")
+        )
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def _load_builtin_profile(name: str) -> Normalizer:
+    data = files(__package__).joinpath("profiles", f"{name}.json").read_bytes()
+    return _load_profile_data(data, name)
+
+
+def load_profile(profile: str) -> Normalizer:
+    """
+    Load a normalization profile.
+
+    profile is either the name of a profile included with dinglehopper (e.g.
+    "nfc_sbb") or the path of a JSON profile file. Profiles are compiled only once
+    and then cached by the digest of their content.
+    """
+    if profile in builtin_profiles():
+        return _load_builtin_profile(profile)
+    if not os.path.isfile(profile):
+        raise ValueError(f"Unknown normalization profile {profile}")
+    with open(profile, "rb") as f:
+        data = f.read()
+    return _load_profile_data(data, profile)
@@ -1,16 +1,95 @@
+import codecs
+import contextlib
+import functools
+import io
+import logging
+import mmap
 import os
+import re
 import sys
-from typing import Dict, Iterator, Optional
+from typing import (
+    IO,
+    TYPE_CHECKING,
+    Any,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+)
 
-import chardet
 from lxml import etree as ET
 from lxml.etree import XMLSyntaxError
-from ocrd_utils import getLogger
-from uniseg.graphemecluster import grapheme_clusters
 
-from .extracted_text import ExtractedText, normalize_sbb
+from .cache import ExtractionCache
+from .extracted_text import ExtractedText, Normalization, get_normalizer
+from .graphemes import grapheme_clusters
 
-log = getLogger("processor.OcrdDinglehopperEvaluate")
+if TYPE_CHECKING:
+    from _typeshed import WriteableBuffer
+
+# This is what ocrd_utils.getLogger() returns, without importing ocrd_utils
+log = logging.getLogger("processor.OcrdDinglehopperEvaluate")
+
+
+# The content of a file, read or memory-mapped, see map_file()
+FileData = Union[bytes, mmap.mmap]
+
+# The size of the chunks that file content is decoded in
+_CHUNK_SIZE = 2**20
+
+
+@contextlib.contextmanager
+def map_file(filename: str) -> Iterator[FileData]:
+    """Memory-map the given file for reading.
+
+    Files that cannot be mapped, e.g. empty files or pipes, are read instead.
+    """
+    with open(filename, "rb") as f:
+        try:
+            data: Optional[mmap.mmap] = mmap.mmap(
+                f.fileno(), 0, access=mmap.ACCESS_READ
+            )
+        except (OSError, ValueError):
+            data = None
+        # Yield outside of the handler, so exceptions of the caller are not chained to
+        # the mmap error
+        if data is None:
+            yield f.read()
+            return
+        with data:
+            yield data
+
+
+class _BufferReader(io.RawIOBase):
+    """A raw binary stream reading from a buffer, e.g. a memory-mapped file."""
+
+    def __init__(self, data: FileData) -> None:
+        self._view = memoryview(data)
+        self._pos = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b: "WriteableBuffer") -> int:
+        with memoryview(b) as view:
+            n = min(len(view), len(self._view) - self._pos)
+            view[:n] = self._view[self._pos : self._pos + n]
+        self._pos += n
+        return n
+
+    def close(self) -> None:
+        # Release the buffer, so a memory-mapped file can be closed
+        self._view.release()
+        super().close()
+
+
+def buffer_reader(data: FileData) -> io.BufferedReader:
+    """Return a binary file object reading data without copying it."""
+    return io.BufferedReader(_BufferReader(data), _CHUNK_SIZE)
 
 
 def alto_namespace(tree: ET._ElementTree) -> Optional[str]:
@@ -34,7 +113,10 @@ def alto_nsmap(tree: ET._ElementTree) -> Dict[str, str]:
     return {"alto": alto_ns}
 
 
-def alto_extract_lines(tree: ET._ElementTree) -> Iterator[ExtractedText]:
+def alto_extract_lines(
+    tree: ET._ElementTree, normalization: Any = Normalization.NFC_SBB
+) -> Iterator[ExtractedText]:
+    normalizer = get_normalizer(normalization)
     nsmap = alto_nsmap(tree)
     for line in tree.iterfind(".//alto:TextLine", namespaces=nsmap):
         line_id = line.attrib.get("ID")
@@ -42,15 +124,26 @@ def alto_extract_lines(tree: ET._ElementTree) -> Iterator[ExtractedText]:
             string.attrib.get("CONTENT", "")
             for string in line.iterfind("alto:String", namespaces=nsmap)
         )
-        normalized_text = normalize_sbb(line_text)
-        clusters = list(grapheme_clusters(normalized_text))
-        yield ExtractedText(line_id, None, None, normalized_text, clusters)
-        # FIXME hardcoded SBB normalization
+        normalized_text = normalizer(line_text)
+        clusters = grapheme_clusters(normalized_text)
+        yield ExtractedText(
+            line_id, None, None, normalized_text, clusters, normalization=normalizer
+        )
 
 
-def alto_extract(tree: ET._ElementTree) -> ExtractedText:
+def alto_extract(
+    tree: ET._ElementTree, *, normalization: Any = Normalization.NFC_SBB
+) -> ExtractedText:
     """Extract text from the given ALTO ElementTree."""
-    return ExtractedText(None, list(alto_extract_lines(tree)), "\n", None, None)
+    normalizer = get_normalizer(normalization)
+    return ExtractedText(
+        None,
+        list(alto_extract_lines(tree, normalizer)),
+        "\n",
+        None,
+        None,
+        normalization=normalizer,
+    )
 
 
 def alto_text(tree):
@@ -71,53 +164,116 @@ def page_namespace(tree):
         raise ValueError("Not a PAGE tree")
 
 
-def page_extract(tree, *, textequiv_level="region"):
+@functools.lru_cache(maxsize=None)
+def page_xpaths(namespace: Optional[str]) -> Dict[str, ET.XPath]:
+    """Return the compiled XPath queries of page_extract() for a PAGE namespace.
+
+    XPath has no default namespace, so the queries for PAGE files without a
+    namespace use unprefixed names.
+    """
+    if namespace is None:
+        prefix, namespaces = "", None
+    else:
+        prefix, namespaces = "page:", {"page": namespace}
+    return {
+        "reading_order": ET.XPath(
+            f"(//{prefix}ReadingOrder)[1]", namespaces=namespaces
+        ),
+        "text_regions": ET.XPath(f"//{prefix}TextRegion", namespaces=namespaces),
+    }
+
+
+def page_extract(
+    tree: ET._ElementTree,
+    *,
+    textequiv_level: str = "region",
+    normalization: Any = Normalization.NFC_SBB,
+) -> ExtractedText:
     """Extract text from the given PAGE content ElementTree."""
 
     # Internally, this is just parsing the Reading Order (if it exists) and
     # and leaves reading the TextRegions to ExtractedText.from_text_segment().
 
-    nsmap = {"page": page_namespace(tree)}
-
-    regions = []
-    reading_order = tree.find(".//page:ReadingOrder", namespaces=nsmap)
-    if reading_order is not None:
-        for group in reading_order.iterfind("./*", namespaces=nsmap):
+    namespace = page_namespace(tree)
+    nsmap = {"page": namespace}
+    xpaths = page_xpaths(namespace)
+    normalizer = get_normalizer(normalization)
+
+    regions: List[ExtractedText] = []
+    text_regions = xpaths["text_regions"](tree)
+    reading_order = xpaths["reading_order"](tree)
+    if reading_order:
+        regions_by_id = index_text_regions(text_regions)
+        for group in reading_order[0].iterfind("./*", namespaces=nsmap):
             regions.extend(
                 extract_texts_from_reading_order_group(
-                    group, tree, nsmap, textequiv_level
+                    group,
+                    tree,
+                    nsmap,
+                    textequiv_level,
+                    normalizer,
+                    regions_by_id=regions_by_id,
                 )
             )
     else:
-        for region in tree.iterfind(".//page:TextRegion", namespaces=nsmap):
+        for region in text_regions:
             regions.append(
                 ExtractedText.from_text_segment(
-                    region, nsmap, textequiv_level=textequiv_level
+                    region,
+                    nsmap,
+                    textequiv_level=textequiv_level,
+                    normalization=normalizer,
                 )
             )
 
     # Filter empty region texts
     regions = [r for r in regions if r.text != ""]
 
-    return ExtractedText(None, regions, "\n", None, None)
+    return ExtractedText(None, regions, "\n", None, None, normalization=normalizer)
+
+
+def index_text_regions(text_regions: Iterable[ET._Element]) -> Dict[str, ET._Element]:
+    """Return the given TextRegions by id, the first one for duplicate ids."""
+    regions_by_id: Dict[str, ET._Element] = {}
+    for region in text_regions:
+        region_id = region.attrib.get("id")
+        if region_id is not None:
+            regions_by_id.setdefault(region_id, region)
+    return regions_by_id
 
 
-def extract_texts_from_reading_order_group(group, tree, nsmap, textequiv_level):
-    """Recursive function to extract the texts from TextRegions in ReadingOrder."""
-    regions = []
+def extract_texts_from_reading_order_group(
+    group: ET._Element,
+    tree: ET._ElementTree,
+    nsmap: Dict[str, Optional[str]],
+    textequiv_level: str,
+    normalization: Any = Normalization.NFC_SBB,
+    *,
+    regions_by_id: Optional[Dict[str, ET._Element]] = None,
+) -> List[ExtractedText]:
+    """Recursive function to extract the texts from TextRegions in ReadingOrder.
 
-    if ET.QName(group.tag).localname in ["OrderedGroup", "OrderedGroupIndexed"]:
+    The region references are looked up in regions_by_id, see index_text_regions().
+    If it is not given, it is built from the tree.
+    """
+    regions: List[ExtractedText] = []
+    if regions_by_id is None:
+        regions_by_id = index_text_regions(
+            page_xpaths(nsmap["page"])["text_regions"](tree)
+        )
+
+    if ET.QName(group).localname in ["OrderedGroup", "OrderedGroupIndexed"]:
         ro_children = list(group)
 
         ro_children = [child for child in ro_children if "index" in child.attrib.keys()]
         ro_children = sorted(ro_children, key=lambda child: int(child.attrib["index"]))
-    elif ET.QName(group.tag).localname in ["UnorderedGroup", "UnorderedGroupIndexed"]:
+    elif ET.QName(group).localname in ["UnorderedGroup", "UnorderedGroupIndexed"]:
         ro_children = list(group)
     else:
         raise NotImplementedError
 
     for ro_child in ro_children:
-        if ET.QName(ro_child.tag).localname in [
+        if ET.QName(ro_child).localname in [
             "OrderedGroup",
             "OrderedGroupIndexed",
             "UnorderedGroup",
@@ -125,18 +281,24 @@ def extract_texts_from_reading_order_group(group, tree, nsmap, textequiv_level):
         ]:
             regions.extend(
                 extract_texts_from_reading_order_group(
-                    ro_child, tree, nsmap, textequiv_level
+                    ro_child,
+                    tree,
+                    nsmap,
+                    textequiv_level,
+                    normalization,
+                    regions_by_id=regions_by_id,
                 )
             )
         else:
             region_id = ro_child.attrib["regionRef"]
-            region = tree.find(
-                './/page:TextRegion[@id="%s"]' % region_id, namespaces=nsmap
-            )
+            region = regions_by_id.get(region_id)
             if region is not None:
                 regions.append(
                     ExtractedText.from_text_segment(
-                        region, nsmap, textequiv_level=textequiv_level
+                        region,
+                        nsmap,
+                        textequiv_level=textequiv_level,
+                        normalization=normalization,
                     )
                 )
             else:
@@ -144,64 +306,302 @@ def extract_texts_from_reading_order_group(group, tree, nsmap, textequiv_level):
     return regions
 
 
+# PAGE elements that page_extract() does not use, i.e. the geometry and the levels
+# below TextLine. parse_xml() drops them while parsing.
+PAGE_UNUSED_ELEMENTS = (
+    "AlternativeImage",
+    "Baseline",
+    "Coords",
+    "Glyph",
+    "TextStyle",
+    "Word",
+)
+
+
+def parse_xml(source: Union[str, IO[bytes]]) -> ET._ElementTree:
+    """Parse the given XML file, dropping the PAGE elements not needed for the text.
+
+    For PAGE files, the elements in PAGE_UNUSED_ELEMENTS are removed as soon as they
+    are parsed, so the polygons and glyphs of a large page do not stay in memory at
+    once. The remaining tree extracts to the same text. Other files are parsed
+    completely.
+    """
+    context = ET.iterparse(
+        source, events=("end",), tag=["{*}" + name for name in PAGE_UNUSED_ELEMENTS]
+    )
+    is_page = None
+    for _, elem in context:
+        if is_page is None:
+            root = elem.getroottree().getroot()
+            is_page = ET.QName(root).localname == "PcGts"
+        if is_page:
+            parent = elem.getparent()
+            # The root element is never removed
+            assert parent is not None
+            parent.remove(elem)
+    assert context.root is not None
+    return ET.ElementTree(context.root)
+
+
 def page_text(tree, *, textequiv_level="region"):
     return page_extract(tree, textequiv_level=textequiv_level).text
 
 
-def detect_encoding(filename):
-    return chardet.detect(open(filename, "rb").read(1024))["encoding"]
+# The encodings of files starting with a BOM, the codecs remove the BOM
+_BOM_ENCODINGS = [
+    (codecs.BOM_UTF32_LE, "utf-32"),
+    (codecs.BOM_UTF32_BE, "utf-32"),
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+]
+
 
+def bom_encoding(data: FileData) -> Optional[str]:
+    """Return the encoding given by the BOM at the start of data, if there is one."""
+    head = data[:4]
+    for bom, encoding in _BOM_ENCODINGS:
+        if head.startswith(bom):
+            return encoding
+    return None
 
-def plain_extract(filename, include_filename_in_id=False, encoding="autodetect"):
+
+def decodes(data: FileData, encoding: str) -> bool:
+    """Return if data is valid in the given encoding, decoding it in chunks."""
+    try:
+        decoder = codecs.getincrementaldecoder(encoding)("strict")
+    except LookupError:
+        return False
+    with memoryview(data) as view:
+        try:
+            for start in range(0, len(view), _CHUNK_SIZE):
+                decoder.decode(view[start : start + _CHUNK_SIZE])
+            decoder.decode(b"", final=True)
+        except UnicodeDecodeError:
+            return False
+    return True
+
+
+def detect_encoding(filename: str, data: Optional[FileData] = None) -> Optional[str]:
+    """Detect the encoding of the given file, from its first KiB.
+
+    If the content of the file was already read, give it as data.
+    """
+    import chardet
+
+    if data is None:
+        with open(filename, "rb") as f:
+            data = f.read(1024)
+    encoding: Optional[str] = chardet.detect(data[:1024])["encoding"]
+    return encoding
+
+
+# The directories and file suffixes that autodetect_encoding() warned about
+_warned_encodings: Set[Tuple[str, str, Optional[str]]] = set()
+
+
+def autodetect_encoding(filename: str, data: FileData) -> Optional[str]:
+    """Return the encoding of the given plain text file, with the content data.
+
+    A BOM decides the encoding, otherwise valid UTF-8 is UTF-8. Only if both fail,
+    chardet guesses the encoding from the content of the file. The guess only
+    depends on the file, but the warning about it is only logged once for the files
+    in the same directory with the same suffix (e.g. "gt.txt") and encoding.
+    """
+    encoding = bom_encoding(data)
+    if encoding is not None:
+        return encoding
+    if decodes(data, "utf-8"):
+        return "utf-8"
+
+    encoding = detect_encoding(filename, data)
+    directory, basename = os.path.split(os.path.abspath(filename))
+    suffix = basename.partition(".")[2]
+    if (directory, suffix, encoding) not in _warned_encodings:
+        _warned_encodings.add((directory, suffix, encoding))
+        log.warning(
+            f"Autodetected encoding as '{encoding}' for *.{suffix} files in"
+            f" {directory}, it is recommended to specify it explicitly with"
+            " --plain-encoding"
+        )
+    return encoding
+
+
+def plain_extract(
+    filename: str,
+    include_filename_in_id: bool = False,
+    encoding: str = "autodetect",
+    *,
+    normalization: Any = Normalization.NFC_SBB,
+    data: Optional[FileData] = None,
+) -> ExtractedText:
+    """Extract the lines of the given plain text file.
+
+    The file is memory-mapped and decoded line by line. If the content of the file
+    was already read or mapped, give it as data.
+    """
     id_template = "{filename} - line {no}" if include_filename_in_id else "line {no}"
+    normalizer = get_normalizer(normalization)
 
-    def make_segment(no, line):
-        normalized_text = normalize_sbb(line)
-        clusters = list(grapheme_clusters(normalized_text))
+    # Share the grapheme cluster strings between the lines, a long text has only a few
+    # distinct ones
+    shared_clusters: Dict[str, str] = {}
+
+    def make_segment(no: int, line: str) -> ExtractedText:
+        normalized_text = normalizer(line)
+        clusters = grapheme_clusters(normalized_text)
+        clusters = list(map(shared_clusters.setdefault, clusters, clusters))
         return ExtractedText(
             id_template.format(filename=os.path.basename(filename), no=no),
             None,
             None,
             normalized_text,
             clusters,
+            normalization=normalizer,
         )
 
+    if data is None:
+        with map_file(filename) as data:
+            return plain_extract(
+                filename,
+                include_filename_in_id,
+                encoding,
+                normalization=normalizer,
+                data=data,
+            )
+
     if encoding == "autodetect":
-        fileencoding = detect_encoding(filename)
-        log.warning(
-            f"Autodetected encoding as '{fileencoding}'"
-            ", it is recommended to specify it explicitly with --plain-encoding"
-        )
+        fileencoding = autodetect_encoding(filename, data)
     else:
         fileencoding = encoding
-    with open(filename, "r", encoding=fileencoding) as f:
+    # Decode like open() in text mode, i.e. with universal newlines, one line at a time
+    with io.TextIOWrapper(buffer_reader(data), encoding=fileencoding) as f:
         return ExtractedText(
             None,
-            [make_segment(no, line.strip()) for no, line in enumerate(f.readlines())],
+            [make_segment(no, line.strip()) for no, line in enumerate(f)],
             "\n",
             None,
             None,
+            normalization=normalizer,
         )
-    # XXX hardcoded SBB normalization
 
 
 def plain_text(filename, encoding="autodetect"):
     return plain_extract(filename, encoding=encoding).text
 
 
-def extract(filename, *, textequiv_level="region", plain_encoding="autodetect"):
+# The number of bytes sniff_format() looks at
+SNIFF_SIZE = 4096
+
+# What may come before the root element of an XML document: the XML declaration,
+# processing instructions, comments and the document type declaration
+_XML_PROLOG = re.compile(
+    r"\s*(?:<\?.*?\?>|<!--.*?-->|<!DOCTYPE(?:[^\[>]|\[.*?\])*>)", re.DOTALL
+)
+_XML_ROOT = re.compile(r"<(?:[A-Za-z_][\w.-]*:)?([A-Za-z_][\w.-]*)")
+
+
+def sniff_format(head: bytes) -> str:
+    """Return the format of a file, given its first bytes.
+
+    The format is "page" or "alto" if the root element is PcGts or alto, "xml" for
+    other XML documents (or if the head is too short to tell) and "plain" otherwise.
+    A plain text file that looks like XML is still detected as "xml".
+    """
+    encoding = bom_encoding(head)
+    if encoding is not None:
+        head_text = head.decode(encoding, errors="ignore")
+    else:
+        # The markup is ASCII in all other encodings we support
+        head_text = head.decode("latin-1")
+
+    pos = 0
+    while match := _XML_PROLOG.match(head_text, pos):
+        pos = match.end()
+    rest = head_text[pos:].lstrip()
+    if not rest.startswith("<"):
+        return "plain"
+    root = _XML_ROOT.match(rest)
+    if root is None:
+        # A truncated prolog or something that is not XML, let the parser decide
+        return "xml"
+    return {"PcGts": "page", "alto": "alto"}.get(root.group(1), "xml")
+
+
+def extract(
+    filename: str,
+    *,
+    textequiv_level: str = "region",
+    plain_encoding: str = "autodetect",
+    normalization: Any = Normalization.NFC_SBB,
+    cache: Optional[ExtractionCache] = None,
+) -> ExtractedText:
     """Extract the text from the given file.
 
-    Supports PAGE, ALTO and falls back to plain text.
+    Supports PAGE, ALTO and falls back to plain text. The text is normalized using
+    the given normalization, see get_normalizer().
+
+    If a cache is given, the extracted text is looked up in and stored in it.
     """
+    normalizer = get_normalizer(normalization)
+    # Read the file only once, for the cache key, detecting the format and extracting
+    with map_file(filename) as data:
+        if cache is not None:
+            key = cache.key(
+                filename, textequiv_level, plain_encoding, normalizer.digest, data=data
+            )
+            extracted: Optional[ExtractedText] = cache.get(key)
+            if extracted is None:
+                extracted = extract_data(
+                    filename,
+                    data,
+                    textequiv_level=textequiv_level,
+                    plain_encoding=plain_encoding,
+                    normalization=normalizer,
+                )
+                cache.put(key, extracted)
+            return extracted
+
+        return extract_data(
+            filename,
+            data,
+            textequiv_level=textequiv_level,
+            plain_encoding=plain_encoding,
+            normalization=normalizer,
+        )
+
+
+def extract_data(
+    filename: str,
+    data: FileData,
+    *,
+    textequiv_level: str = "region",
+    plain_encoding: str = "autodetect",
+    normalization: Any = Normalization.NFC_SBB,
+) -> ExtractedText:
+    """Extract the text from the given content of the file filename.
+
+    See extract().
+    """
+    file_format = sniff_format(data[:SNIFF_SIZE])
+    if file_format != "plain":
+        try:
+            with buffer_reader(data) as f:
+                tree = parse_xml(f)
+        except (XMLSyntaxError, UnicodeDecodeError):
+            file_format = "plain"
+    if file_format == "plain":
+        return plain_extract(
+            filename, encoding=plain_encoding, normalization=normalization, data=data
+        )
+    if file_format == "alto":
+        return alto_extract(tree, normalization=normalization)
     try:
-        tree = ET.parse(filename)
-    except (XMLSyntaxError, UnicodeDecodeError):
-        return plain_extract(filename, encoding=plain_encoding)
-    try:
-        return page_extract(tree, textequiv_level=textequiv_level)
+        return page_extract(
+            tree, textequiv_level=textequiv_level, normalization=normalization
+        )
     except ValueError:
-        return alto_extract(tree)
+        return alto_extract(tree, normalization=normalization)
 
 
 def text(filename):
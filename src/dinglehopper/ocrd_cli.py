@@ -27,6 +27,7 @@ class OcrdDinglehopperEvaluate(Processor):
         metrics = self.parameter["metrics"]
         textequiv_level = self.parameter["textequiv_level"]
         plain_encoding = self.parameter["plain_encoding"]
+        normalization = self.parameter["normalization"]
 
         # wrong number of inputs: let fail
         gt_file, ocr_file = input_files
@@ -54,6 +55,7 @@ class OcrdDinglehopperEvaluate(Processor):
             metrics=metrics,
             textequiv_level=textequiv_level,
             plain_encoding=plain_encoding,
+            normalization=normalization,
         )
 
         # Add reports to the workspace
@@ -0,0 +1,32 @@
+import functools
+import os
+
+from jinja2 import Environment, FileSystemLoader
+
+
+def json_float(value):
+    """Convert a float value to an JSON float.
+
+    This is here so that float('inf') yields "Infinity", not "inf".
+    """
+    if value == float("inf"):
+        return "Infinity"
+    elif value == float("-inf"):
+        return "-Infinity"
+    else:
+        return str(value)
+
+
+@functools.lru_cache(maxsize=None)
+def template_environment() -> Environment:
+    """Return the Jinja environment of the report templates.
+
+    The environment is shared, so the templates are only compiled once.
+    """
+    env = Environment(
+        loader=FileSystemLoader(
+            os.path.join(os.path.dirname(os.path.realpath(__file__)), "templates")
+        )
+    )
+    env.filters["json_float"] = json_float
+    return env
@@ -7,6 +7,7 @@ from lxml import etree as ET
 from uniseg.graphemecluster import grapheme_clusters
 
 from .. import ExtractedText, seq_align
+from ..vocabulary import Vocabulary
 
 
 def test_text():
@@ -158,3 +159,84 @@ def test_textequiv(attributes, expected_index, expected_log, caplog):
         assert "no_index" not in caplog.text
     else:
         assert expected_log in caplog.text
+
+
+def test_flattened():
+    test1 = ExtractedText(
+        None,
+        [
+            ExtractedText(
+                "r0",
+                [
+                    ExtractedText("l0", None, None, "foo", grapheme_clusters("foo")),
+                    ExtractedText("l1", None, None, "m̃", grapheme_clusters("m̃")),
+                ],
+                "\n",
+                None,
+                None,
+            ),
+            ExtractedText("r1", None, None, "bar", grapheme_clusters("bar")),
+        ],
+        " ",
+        None,
+        None,
+    )
+
+    assert test1.text == "foo\nm̃ bar"
+    assert test1.grapheme_clusters == ["f", "o", "o", "\n", "m̃", " ", "b", "a", "r"]
+
+    # Repeated access does not rebuild the text
+    assert test1.text is test1.text
+
+    vocabulary: Vocabulary[str] = Vocabulary()
+    codes = test1.encode_grapheme_clusters(vocabulary)
+    assert vocabulary.decode(codes) == test1.grapheme_clusters
+
+
+def test_flattened_glyph_level():
+    """Test that joining with an empty joiner does not lose grapheme clusters"""
+    test1 = ExtractedText(
+        None,
+        [
+            ExtractedText("g0", None, None, "a", grapheme_clusters("a")),
+            ExtractedText("g1", None, None, "b", grapheme_clusters("b")),
+        ],
+        "",
+        None,
+        None,
+    )
+
+    assert test1.text == "ab"
+    assert test1.grapheme_clusters == ["a", "b"]
+
+
+def test_segment_id_for_cluster_pos():
+    test1 = ExtractedText(
+        None,
+        [
+            ExtractedText("s0", None, None, "m̃a", grapheme_clusters("m̃a")),
+            ExtractedText("s1", None, None, "", grapheme_clusters("")),
+            ExtractedText("s2", None, None, "bc", grapheme_clusters("bc")),
+        ],
+        " ",
+        None,
+        None,
+    )
+
+    # "m̃a  bc", m̃ is two code points but one grapheme cluster
+    assert test1.segment_id_for_pos(1) == "s0"
+    assert test1.segment_id_for_pos(2) == "s0"
+    assert test1.segment_id_for_pos(3) is None
+    assert test1.segment_id_for_pos(5) == "s2"
+
+    assert test1.segment_id_for_cluster_pos(0) == "s0"
+    assert test1.segment_id_for_cluster_pos(1) == "s0"
+    assert test1.segment_id_for_cluster_pos(2) is None
+    assert test1.segment_id_for_cluster_pos(3) is None
+    assert test1.segment_id_for_cluster_pos(4) == "s2"
+
+    positions = range(len(test1.grapheme_clusters))
+    assert test1.segment_ids_for_cluster_positions(positions) == [
+        test1.segment_id_for_cluster_pos(pos) for pos in positions
+    ]
+    assert test1.segment_ids_for_cluster_positions([]) == []
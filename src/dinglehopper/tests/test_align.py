@@ -2,7 +2,14 @@ import math
 
 import pytest
 
-from .. import align, distance, score_hint, seq_align
+from .. import (
+    Alignment,
+    align,
+    distance,
+    score_hint,
+    seq_align,
+    seq_align_blocks,
+)
 from .util import unzip
 
 
@@ -89,6 +96,77 @@ def test_with_some_fake_ocr_errors():
     assert list(right[-1:]) == ["b"]
 
 
+def test_blocks():
+    result = list(seq_align_blocks(list("abcdexyz"), list("xbcqqdeyz")))
+    assert result == [
+        ("replace", ["a"], ["x"]),
+        ("equal", ["b", "c"], ["b", "c"]),
+        ("insert", [], ["q", "q"]),
+        ("equal", ["d", "e"], ["d", "e"]),
+        ("delete", ["x"], []),
+        ("equal", ["y", "z"], ["y", "z"]),
+    ]
+
+
+def test_blocks_long_equal_run():
+    s = ["a"] * 50000
+    assert list(seq_align_blocks(s, s)) == [("equal", s, s)]
+
+
+def test_alignment():
+    alignment = Alignment.from_sequences("Abstand", "Sand")
+    assert alignment.distance == distance("Abstand", "Sand") == 4
+    assert alignment.error_rate_n() == (4 / 7, 7)
+    assert list(alignment.blocks()) == [
+        ("replace", "A", "S"),
+        ("delete", "bst", ""),
+        ("equal", "and", "and"),
+    ]
+
+    assert Alignment.from_sequences("", "").error_rate_n() == (0, 0)
+    assert Alignment.from_sequences("", "Foo").error_rate_n() == (math.inf, 0)
+
+
+@pytest.mark.parametrize("max_cells", [1, 16, 100])
+def test_alignment_linear_memory(max_cells):
+    s1 = "Über die vielen Sorgen wegen deſſelben vergaß Hartkopf"
+    s2 = "SomeJunk Übey die vielen Sorgen wegen AdditionalJunk deffelben vcrgab"
+    alignment = Alignment.from_sequences(s1, s2, max_cells=max_cells)
+    assert alignment.distance == distance(s1, s2)
+
+    aligned1 = aligned2 = ""
+    for tag, block1, block2 in alignment.blocks():
+        if tag == "equal":
+            assert block1 == block2
+        elif tag == "replace":
+            assert len(block1) == len(block2)
+        aligned1 += "".join(block1)
+        aligned2 += "".join(block2)
+    assert aligned1 == s1
+    assert aligned2 == s2
+
+
+def test_alignment_anchored():
+    s1 = "Über die vielen Sorgen wegen deſſelben vergaß Hartkopf, der Frau Amtmännin"
+    s2 = "Übey die vielen Sorgen wegen deffelben vcrgab Hartkopf, der Frau Amimännin"
+    alignment = Alignment.from_sequences(s1, s2, anchored=True)
+    assert not alignment.exact
+    assert alignment.distance == distance(s1, s2)
+
+    aligned1 = aligned2 = ""
+    for _, block1, block2 in alignment.blocks():
+        aligned1 += "".join(block1)
+        aligned2 += "".join(block2)
+    assert aligned1 == s1
+    assert aligned2 == s2
+
+
+def test_alignment_anchored_without_anchors():
+    alignment = Alignment.from_sequences("Fnord", "Food", anchored=True)
+    assert alignment.exact
+    assert alignment.distance == 2
+
+
 def test_lines():
     """Test comparing list of lines.
 
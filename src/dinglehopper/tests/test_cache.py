@@ -0,0 +1,63 @@
+import os
+
+from ..cache import ExtractionCache
+from ..ocr_files import extract
+
+data_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+
+
+def test_extract_cache(tmp_path):
+    cache = ExtractionCache(str(tmp_path / "cache"))
+    fn = os.path.join(data_dir, "test-gt.page2018.xml")
+
+    extracted = extract(fn, textequiv_level="line", cache=cache)
+    assert len(os.listdir(tmp_path / "cache")) == 1
+    cached = extract(fn, textequiv_level="line", cache=cache)
+    assert len(os.listdir(tmp_path / "cache")) == 1
+
+    assert cached is not extracted
+    assert cached.text == extracted.text
+    assert cached.grapheme_clusters == extracted.grapheme_clusters
+    assert cached.segment_id_for_pos(0) == extracted.segment_id_for_pos(0)
+
+    # Different parameters, different entries
+    extract(fn, textequiv_level="region", cache=cache)
+    extract(fn, textequiv_level="line", normalization="nfc", cache=cache)
+    assert len(os.listdir(tmp_path / "cache")) == 3
+
+
+def test_cache_lru(tmp_path):
+    cache = ExtractionCache(str(tmp_path), max_size=3500)
+    for key in "abc":
+        cache.put(key, "x" * 1000)
+        os.utime(tmp_path / f"{key}.pickle", (0, ord(key)))
+    assert cache.get("a") == "x" * 1000  # Now the most recently used
+
+    cache.put("d", "x" * 1000)
+    assert sorted(os.listdir(tmp_path)) == ["a.pickle", "c.pickle", "d.pickle"]
+    assert cache.get("b") is None
+
+
+def test_cache_unreadable(tmp_path):
+    cache = ExtractionCache(str(tmp_path))
+    (tmp_path / "a.pickle").write_bytes(b"garbage")
+    assert cache.get("a") is None
+    assert not (tmp_path / "a.pickle").exists()
+
+
+def test_cache_put_does_not_scan(tmp_path, monkeypatch):
+    cache = ExtractionCache(str(tmp_path), max_size=50_000)
+    scans = []
+    scandir = os.scandir
+
+    def counting_scandir(path):
+        scans.append(path)
+        return scandir(path)
+
+    monkeypatch.setattr(os, "scandir", counting_scandir)
+    for i in range(100):
+        cache.put(str(i), "x" * 1000)
+    # Once for the initial size and once per eviction of 10% of the cache, not for
+    # every put()
+    assert len(scans) < 20
+    assert sum(f.stat().st_size for f in tmp_path.iterdir()) <= 50_000
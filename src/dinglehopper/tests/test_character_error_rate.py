@@ -3,7 +3,7 @@ from __future__ import division, print_function
 import math
 import unicodedata
 
-from .. import character_error_rate
+from .. import character_error_rate, character_error_rate_batch
 
 
 def test_character_error_rate():
@@ -40,3 +40,16 @@ def test_character_error_rate_hard():
     # be symmetrical.
     assert character_error_rate(s2, s1) == 1 / 6
     assert character_error_rate(s1, s2) == 1 / 6
+
+
+def test_character_error_rate_batch():
+    references = ["a", "Foo", "Foo", "", "", "Schlyñ"]
+    compared = ["a", "Bar", "Food", "", "Foo", "Schlym̃"]
+
+    d, n, cer = character_error_rate_batch(references, compared)
+
+    assert list(d) == [0, 3, 1, 0, 3, 1]
+    assert list(n) == [1, 3, 3, 0, 0, 6]
+    assert list(cer) == [
+        character_error_rate(r, c) for r, c in zip(references, compared)
+    ]
@@ -0,0 +1,94 @@
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from ..cli import process
+from ..config import Config
+from ..evaluator import Evaluator
+from ..extracted_text import ExtractedText
+
+data_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+
+
+def test_evaluator_compare():
+    evaluator = Evaluator(differences=True, normalization="nfc")
+    result = evaluator.compare(
+        ExtractedText.from_str("Schlym̃ ſoll", normalization=evaluator.normalizer),
+        ExtractedText.from_str("Schlyñ ſoll", normalization=evaluator.normalizer),
+    )
+    assert result.cer == pytest.approx(1 / 11)
+    assert result.n_characters == 11
+    assert result.wer == pytest.approx(1 / 2)
+    assert result.diff_c == {"m̃ :: ñ": 1}
+
+    report = json.loads(evaluator.render(result, "json"))
+    assert report["cer"] == pytest.approx(result.cer)
+    assert report["differences"]["word_level"] == {"Schlym̃ :: Schlyñ": 1}
+    assert result.exact_alignment
+    assert report["exact_alignment"] is True
+
+
+def test_evaluator_compare_anchored(monkeypatch):
+    monkeypatch.setattr(Config, "anchored_alignment", True)
+    evaluator = Evaluator(formats=("json", "html"))
+    result = evaluator.compare(
+        ExtractedText.from_str(
+            "Über die vielen Sorgen wegen deſſelben vergaß Hartkopf, der Frau Amtmännin"
+        ),
+        ExtractedText.from_str(
+            "Übey die vielen Sorgen wegen deffelben vcrgab Hartkopf, der Frau Amimännin"
+        ),
+    )
+    assert not result.exact_alignment
+    assert json.loads(evaluator.render(result, "json"))["exact_alignment"] is False
+    assert "The alignment is approximate" in evaluator.render(result, "html")
+
+
+def test_evaluator_compare_encodes_gt_once():
+    evaluator = Evaluator(normalization="nfc")
+    gt_text = ExtractedText.from_str("Schlym̃ ſoll", normalization=evaluator.normalizer)
+    gt_encoded = gt_text.encoded
+    n_clusters, n_words = len(gt_encoded.clusters), len(gt_encoded.words)
+    for ocr in ["Schlyñ ſoll", "Schlym ſol", "ganz anders"]:
+        ocr_text = ExtractedText.from_str(ocr, normalization=evaluator.normalizer)
+        result = evaluator.compare(gt_text, ocr_text)
+        assert result.cer > 0
+    assert gt_text.encoded is gt_encoded
+    assert len(gt_encoded.clusters) == n_clusters
+    assert len(gt_encoded.words) == n_words
+
+
+@pytest.mark.integration
+def test_evaluator_same_as_process(tmp_path):
+    gt = os.path.join(data_dir, "test-gt.page2018.xml")
+    ocr = os.path.join(data_dir, "test-fake-ocr.page2018.xml")
+    process(gt, ocr, "report", str(tmp_path), differences=True)
+
+    evaluator = Evaluator(differences=True, formats=("json",))
+    evaluator.write_reports(evaluator.evaluate(gt, ocr), "evaluator", str(tmp_path))
+    assert sorted(os.listdir(tmp_path)) == [
+        "evaluator.json",
+        "report.html",
+        "report.json",
+    ]
+    with open(tmp_path / "report.json") as f, open(tmp_path / "evaluator.json") as g:
+        assert f.read() == g.read()
+
+
+@pytest.mark.integration
+def test_evaluator_threads():
+    """Test that an Evaluator shared by several threads gives the same results."""
+    gt = os.path.join(data_dir, "test-gt.page2018.xml")
+    ocrs = [
+        os.path.join(data_dir, "test-fake-ocr.page2018.xml"),
+        os.path.join(data_dir, "test.page2018.xml"),
+        os.path.join(data_dir, "lorem-ipsum", "lorem-ipsum-scan.gt.page.xml"),
+    ]
+
+    evaluator = Evaluator(differences=True, textequiv_level="line")
+    expected = [evaluator.evaluate(gt, ocr) for ocr in ocrs]
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        results = list(executor.map(evaluator.evaluate, [gt] * 8 * len(ocrs), ocrs * 8))
+    assert results == expected * 8
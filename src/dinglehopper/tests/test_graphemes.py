@@ -0,0 +1,27 @@
+import pytest
+import uniseg.graphemecluster
+
+from ..graphemes import grapheme_clusters
+
+
+@pytest.mark.parametrize(
+    "s",
+    [
+        "",
+        "Foo bar",
+        "Schlym̃",
+        "m̃m̃ m̃",
+        "a\r\nb",
+        "\U0001f1e9\U0001f1ea\U0001f1e6",  # Regional indicators
+        "\U0001f468‍\U0001f469‍\U0001f467 family",  # ZWJ sequence
+        "각 각",  # Hangul
+        "؀123",  # Prepend
+        "क्षि",  # Devanagari conjunct and spacing mark
+    ],
+)
+def test_grapheme_clusters(s):
+    assert grapheme_clusters(s) == list(uniseg.graphemecluster.grapheme_clusters(s))
+
+
+def test_grapheme_clusters_simple():
+    assert grapheme_clusters("ſchön") == ["ſ", "c", "h", "ö", "n"]
@@ -0,0 +1,70 @@
+import importlib
+import subprocess
+import sys
+
+import pytest
+
+# The command line tools should start quickly, so their modules must not import the
+# modules doing the actual work before they are needed.
+HEAVY_MODULES = {
+    "chardet",
+    "jinja2",
+    "lxml",
+    "multimethod",
+    "numpy",
+    "ocrd_utils",
+    "rapidfuzz",
+    "tqdm",
+    "uniseg",
+}
+
+# Maximum cumulative import time of a command line tool module, in seconds. Importing
+# click alone takes most of it.
+IMPORT_TIME_BUDGET = 0.2
+
+
+def import_times(module):
+    """Import module in a new interpreter, return the cumulative import times."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        times[name.strip()] = int(cumulative) / 1e6
+    return times
+
+
+@pytest.mark.parametrize(
+    "module",
+    [
+        "dinglehopper",
+        "dinglehopper.cli",
+        "dinglehopper.cli_compare",
+        "dinglehopper.cli_extract",
+        "dinglehopper.cli_line_dirs",
+        "dinglehopper.cli_summarize",
+    ],
+)
+def test_import_time(module):
+    times = import_times(module)
+    imported = {name.split(".")[0] for name in times}
+    assert imported & HEAVY_MODULES == set()
+    assert times[module] < IMPORT_TIME_BUDGET
+
+
+def test_lazy_exports():
+    import dinglehopper
+
+    # Importing a module of the same name as an exported function keeps the function
+    module = importlib.import_module("dinglehopper.word_error_rate")
+    assert dinglehopper.word_error_rate is module.word_error_rate
+    assert dinglehopper.word_error_rate("a b", "a c") == 0.5
+
+    assert set(dinglehopper.__all__) <= set(dir(dinglehopper))
+    assert not hasattr(dinglehopper, "no_such_name")
@@ -0,0 +1,109 @@
+import json
+import os
+
+import pytest
+from click.testing import CliRunner
+from ocrd_utils import initLogging
+
+from dinglehopper.cli import process as process_pair
+from dinglehopper.cli_compare import main, process, report_prefixes
+from dinglehopper.extracted_text import EncodedText
+
+data_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+
+
+def test_report_prefixes():
+    assert report_prefixes(["a/x.xml", "b/y.xml"]) == ["x.xml-report", "y.xml-report"]
+    assert report_prefixes(["m1/a/x.xml", "m2/a/x.xml"], "r") == [
+        "m1_a_x.xml-r",
+        "m2_a_x.xml-r",
+    ]
+    with pytest.raises(ValueError):
+        report_prefixes(["x.xml", "./x.xml"])
+
+
+@pytest.mark.integration
+def test_compare_encodes_gt_once(tmp_path, monkeypatch):
+    gt = os.path.join(data_dir, "test-gt.page2018.xml")
+    ocrs = [
+        os.path.join(data_dir, "test-fake-ocr.page2018.xml"),
+        os.path.join(data_dir, "test.page2018.xml"),
+    ]
+
+    encoded = []
+    from_text = EncodedText.from_text.__func__  # type: ignore[attr-defined]
+
+    def counting_from_text(cls, text, clusters, words):
+        encoded.append(text)
+        return from_text(cls, text, clusters, words)
+
+    monkeypatch.setattr(EncodedText, "from_text", classmethod(counting_from_text))
+    _, failed = process(gt, ocrs, reports_folder=str(tmp_path), jobs=1)
+    assert failed == []
+    # The GT once, and each OCR text
+    assert len(encoded) == 1 + len(ocrs)
+    assert len({id(text) for text in encoded}) == len(encoded)
+
+
+@pytest.mark.integration
+def test_compare(tmp_path):
+    """
+    Test that comparing one GT with several OCR files yields the same reports as
+    comparing the pairs, plus the comparison table.
+    """
+    gt = os.path.join(data_dir, "test-gt.page2018.xml")
+    ocrs = [
+        os.path.join(data_dir, "test-fake-ocr.page2018.xml"),
+        os.path.join(data_dir, "test.page2018.xml"),
+    ]
+
+    initLogging()
+    for jobs in (1, 2):
+        rows, failed = process(
+            gt,
+            ocrs,
+            reports_folder=str(tmp_path / f"reports-{jobs}"),
+            differences=True,
+            jobs=jobs,
+        )
+        assert failed == []
+        assert [row["ocr"] for row in rows] == ocrs
+
+    for ocr, prefix in zip(ocrs, report_prefixes(ocrs)):
+        process_pair(gt, ocr, prefix, str(tmp_path / "pairs"), differences=True)
+        with open(tmp_path / "pairs" / f"{prefix}.json") as f:
+            expected = json.load(f)
+        for jobs in (1, 2):
+            with open(tmp_path / f"reports-{jobs}" / f"{prefix}.json") as f:
+                assert json.load(f) == expected
+
+    with open(tmp_path / "reports-2" / "report-comparison.json") as f:
+        comparison = json.load(f)
+    assert comparison["gt"] == gt
+    assert [c["ocr"] for c in comparison["comparisons"]] == ocrs
+    assert comparison["comparisons"][0]["cer"] == pytest.approx(rows[0]["cer"])
+    assert os.path.exists(tmp_path / "reports-2" / "report-comparison.html")
+
+
+@pytest.mark.integration
+def test_compare_cli_failure(tmp_path):
+    """
+    Test that an OCR file that fails to process does not stop the others.
+    """
+    bad = tmp_path / "bad.xml"
+    # Neither PAGE nor ALTO
+    bad.write_text("<foo/>")
+    gt = os.path.join(data_dir, "test-gt.page2018.xml")
+    ocr = os.path.join(data_dir, "test-fake-ocr.page2018.xml")
+    reports = tmp_path / "reports"
+
+    result = CliRunner().invoke(
+        main, [gt, ocr, str(bad), "--reports-folder", str(reports), "-j", "1"]
+    )
+    assert result.exit_code != 0
+    assert "bad.xml" in result.output
+
+    with open(reports / "report-comparison.json") as f:
+        comparison = json.load(f)
+    assert [c["ocr"] for c in comparison["comparisons"]] == [ocr]
+    assert os.path.exists(reports / "test-fake-ocr.page2018.xml-report.html")
@@ -1,4 +1,8 @@
 import os
+import shutil
+import subprocess
+import sys
+import textwrap
 
 import pytest
 from ocrd_utils import initLogging
@@ -51,3 +55,90 @@ def test_cli_fail_without_gt(tmp_path):
     )
 
     assert len(os.listdir(tmp_path / "reports")) == 2 * 2
+
+
+@pytest.mark.integration
+def test_cli_directory_jobs(tmp_path):
+    """
+    Test that processing in parallel yields the same reports as processing serially.
+    """
+
+    initLogging()
+    for jobs in (1, 2):
+        failed = process_dir(
+            os.path.join(data_dir, "directory-test", "gt"),
+            os.path.join(data_dir, "directory-test", "ocr"),
+            "report",
+            str(tmp_path / f"reports-{jobs}"),
+            metrics=False,
+            differences=True,
+            textequiv_level="line",
+            jobs=jobs,
+        )
+        assert failed == []
+
+    for report in os.listdir(tmp_path / "reports-1"):
+        with open(tmp_path / "reports-1" / report) as serial, open(
+            tmp_path / "reports-2" / report
+        ) as parallel:
+            assert serial.read() == parallel.read()
+
+
+@pytest.mark.integration
+def test_cli_directory_failure(tmp_path):
+    """
+    Test that a file that fails to process does not stop the other files.
+    """
+
+    for d in ("gt", "ocr"):
+        os.makedirs(tmp_path / d)
+        shutil.copy(
+            os.path.join(data_dir, "directory-test", d, "1.xml"), tmp_path / d / "1.xml"
+        )
+        # Neither PAGE nor ALTO
+        with open(tmp_path / d / "2.xml", "w") as f:
+            f.write("<foo/>")
+
+    initLogging()
+    failed = process_dir(
+        str(tmp_path / "gt"),
+        str(tmp_path / "ocr"),
+        "report",
+        str(tmp_path / "reports"),
+        jobs=2,
+    )
+
+    assert failed == ["2.xml"]
+    assert sorted(os.listdir(tmp_path / "reports")) == [
+        "1.xml-report.html",
+        "1.xml-report.json",
+    ]
+
+
+@pytest.mark.integration
+def test_cli_directory_jobs_config(tmp_path):
+    """
+    Test that the worker processes use the Config, even if they are not forked.
+    """
+    script = textwrap.dedent(
+        f"""\
+        import multiprocessing
+        from dinglehopper.cli import process_dir
+        from dinglehopper.config import Config
+
+        if __name__ == "__main__":
+            multiprocessing.set_start_method("spawn")
+            Config.extraction_cache_dir = {str(tmp_path / "cache")!r}
+            process_dir(
+                {os.path.join(data_dir, "directory-test", "gt")!r},
+                {os.path.join(data_dir, "directory-test", "ocr")!r},
+                "report",
+                {str(tmp_path / "reports")!r},
+                jobs=2,
+            )
+        """
+    )
+    (tmp_path / "script.py").write_text(script)
+    subprocess.run([sys.executable, str(tmp_path / "script.py")], check=True)
+
+    assert os.path.isdir(tmp_path / "cache") and os.listdir(tmp_path / "cache")
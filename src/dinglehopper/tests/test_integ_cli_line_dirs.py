@@ -4,7 +4,9 @@ import re
 
 import pytest
 
+from .. import extracted_text
 from ..cli_line_dirs import process
+from ..normalization import load_profile
 from .util import working_directory
 
 data_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
@@ -22,8 +24,10 @@ def test_cli_line_dirs_basic(tmp_path):
             print(jsonf.read())
         with open("report.json", "r") as jsonf:
             j = json.load(jsonf)
-            assert j["cer"] == pytest.approx(0.1071429)
-            assert j["wer"] == pytest.approx(0.5)
+            # "AnÖther" (UTF-8) vs. "Another" and "Tis" vs. "This"
+            assert j["cer"] == pytest.approx(2 / 28)
+            assert j["wer"] == pytest.approx(2 / 6)
+            assert j["exact_alignment"] is True
 
 
 @pytest.mark.integration
@@ -57,5 +61,52 @@ def test_cli_line_dirs_merged(tmp_path):
             print(jsonf.read())
         with open("report.json", "r") as jsonf:
             j = json.load(jsonf)
-            assert j["cer"] == pytest.approx(0.1071429)
-            assert j["wer"] == pytest.approx(0.5)
+            # "AnÖther" (UTF-8) vs. "Another" and "Tis" vs. "This"
+            assert j["cer"] == pytest.approx(2 / 28)
+            assert j["wer"] == pytest.approx(2 / 6)
+
+
+@pytest.mark.integration
+def test_cli_line_dirs_jobs(tmp_path):
+    """Test that comparing in parallel produces the same report as serially"""
+
+    gt_dir = os.path.join(data_dir, "line_dirs/merged")
+    ocr_dir = os.path.join(data_dir, "line_dirs/merged")
+    for jobs in (1, 2):
+        with working_directory(tmp_path):
+            process(
+                gt_dir,
+                ocr_dir,
+                f"report-{jobs}",
+                gt_suffix=".gt.txt",
+                ocr_suffix=".some-ocr.txt",
+                jobs=jobs,
+            )
+
+    for report_suffix in (".html", ".json"):
+        with open(tmp_path / f"report-1{report_suffix}") as serial, open(
+            tmp_path / f"report-2{report_suffix}"
+        ) as parallel:
+            assert serial.read() == parallel.read()
+
+
+@pytest.mark.integration
+def test_cli_line_dirs_loads_normalization_once(tmp_path, monkeypatch):
+    loaded = []
+
+    def counting_load_profile(profile):
+        loaded.append(profile)
+        return load_profile(profile)
+
+    monkeypatch.setattr(extracted_text, "load_profile", counting_load_profile)
+    with working_directory(tmp_path):
+        process(
+            os.path.join(data_dir, "line_dirs/merged"),
+            os.path.join(data_dir, "line_dirs/merged"),
+            "report",
+            gt_suffix=".gt.txt",
+            ocr_suffix=".some-ocr.txt",
+            normalization="nfc_sbb",
+            jobs=1,
+        )
+    assert loaded == ["nfc_sbb"]
@@ -0,0 +1,93 @@
+import json
+import pickle
+import unicodedata
+
+import pytest
+
+from ..extracted_text import (
+    ExtractedText,
+    Normalization,
+    get_normalizer,
+    is_normalized,
+    normalize,
+)
+from ..normalization import Normalizer, builtin_profiles, load_profile
+
+
+def test_normalizer():
+    normalizer = Normalizer([{"ﬁ": "fi", "": "Qu"}, {"==": "–", "uͤ": "ü"}])
+
+    assert normalizer("ﬁnden") == "finden"
+    assert normalizer("a == b") == "a – b"
+    # NFC first
+    assert normalizer("Schlym̃") == unicodedata.normalize("NFC", "Schlym̃")
+    # The second phase sees the result of the first phase
+    assert normalizer("ͤ") == "Qü"
+
+
+def test_normalizer_single_pass():
+    # Longest match wins, and replacements are not replaced again
+    normalizer = Normalizer([{"=": "-", "==": "–", "-": "+"}])
+    assert normalizer("a=b==c===d-") == "a-b–c–-d+"
+
+
+def test_is_normalized():
+    normalizer = Normalizer([{"ﬁ": "fi"}, {"==": "–"}])
+
+    assert normalizer.is_normalized("finden")
+    assert normalizer.is_normalized("")
+    assert not normalizer.is_normalized("ﬁnden")
+    assert not normalizer.is_normalized("a == b")
+    assert not normalizer.is_normalized(unicodedata.normalize("NFD", "Schlyñ"))
+
+
+def test_normalize_sbb():
+    assert normalize("ſoͤhne ﬁnden", Normalization.NFC_SBB) == "ſöhne finden"
+    assert is_normalized("ſöhne finden", Normalization.NFC_SBB)
+    assert not is_normalized("ſoͤhne finden", Normalization.NFC_SBB)
+
+
+def test_load_profile():
+    assert set(builtin_profiles()) >= {"nfc", "nfc_sbb"}
+    assert load_profile("nfc_sbb") is load_profile("nfc_sbb")
+    assert load_profile("nfc_sbb") == get_normalizer(Normalization.NFC_SBB)
+    assert load_profile("nfc")("ﬁnden") == "ﬁnden"
+    assert load_profile("nfc_sbb")("ﬁnden") == "finden"
+
+    with pytest.raises(ValueError):
+        load_profile("no-such-profile")
+
+
+def test_load_profile_file(tmp_path):
+    profile = {
+        "nfc": True,
+        "phases": [{"rules": [{"from": "ſ", "to": "s", "comment": "long s"}]}],
+    }
+    profile_fn = tmp_path / "long-s.json"
+    profile_fn.write_text(json.dumps(profile))
+
+    normalizer = load_profile(str(profile_fn))
+    assert normalizer("Waſſer") == "Wasser"
+    # Cached by content
+    copy_fn = tmp_path / "copy.json"
+    copy_fn.write_bytes(profile_fn.read_bytes())
+    assert load_profile(str(copy_fn)) is normalizer
+
+    text = ExtractedText.from_str("Waſſer ﬁnden", normalization=str(profile_fn))
+    assert text.text == "Wasser ﬁnden"
+    assert text.normalization == normalizer
+
+    profile_fn.write_text('{"phases": [{"rule": []}]}')
+    with pytest.raises(ValueError):
+        load_profile(str(profile_fn))
+
+
+def test_normalizer_pickle():
+    normalizer = load_profile("nfc_sbb")
+    # Unpickling reuses the compiled normalizer
+    assert pickle.loads(pickle.dumps(normalizer)) is normalizer
+
+    normalizer = Normalizer([{"ﬁ": "fi"}])
+    unpickled = pickle.loads(pickle.dumps(normalizer))
+    assert unpickled == normalizer
+    assert unpickled("ﬁnden") == "finden"
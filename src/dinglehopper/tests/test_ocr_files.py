@@ -1,10 +1,21 @@
+import builtins
 import os
 import re
 import textwrap
 
 import lxml.etree as ET
-
-from .. import alto_namespace, alto_text, page_namespace, page_text, plain_text, text
+import pytest
+
+from .. import (
+    alto_namespace,
+    alto_text,
+    ocr_files,
+    page_namespace,
+    page_text,
+    plain_text,
+    text,
+)
+from ..ocr_files import parse_xml, sniff_format
 from .util import working_directory
 
 data_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
@@ -135,6 +146,44 @@ def test_page_order():
     )
 
 
+def test_page_order_many_regions():
+    ns = "http://schema.primaresearch.org/PAGE/gts/pagecontent/2019-07-15"
+    n = 500
+    refs = "".join(
+        f'<RegionRefIndexed index="{i}" regionRef="r{n - 1 - i}"/>' for i in range(n)
+    )
+    regions = "".join(
+        f'<TextRegion id="r{i}"><TextEquiv><Unicode>{i}</Unicode></TextEquiv>'
+        "</TextRegion>"
+        for i in range(n)
+    )
+    tree = ET.ElementTree(
+        ET.fromstring(
+            f'<PcGts xmlns="{ns}"><Page><ReadingOrder><OrderedGroup id="g">{refs}'
+            f"</OrderedGroup></ReadingOrder>{regions}</Page></PcGts>"
+        )
+    )
+    assert page_text(tree) == "\n".join(str(i) for i in reversed(range(n)))
+
+
+def test_page_no_namespace():
+    # The TextEquivs are not found without the PAGE namespace, as before the
+    # ReadingOrder was indexed
+    for reading_order in (
+        "",
+        '<ReadingOrder><OrderedGroup id="g">'
+        '<RegionRefIndexed index="0" regionRef="r1"/></OrderedGroup></ReadingOrder>',
+    ):
+        tree = ET.ElementTree(
+            ET.fromstring(
+                f"<PcGts><Page>{reading_order}"
+                '<TextRegion id="r1"><TextEquiv><Unicode>Hallo</Unicode></TextEquiv>'
+                "</TextRegion></Page></PcGts>"
+            )
+        )
+        assert page_text(tree) == ""
+
+
 def test_page_mixed_regions():
     # This file contains ImageRegions and TextRegions in the ReadingOrder
     tree = ET.parse(os.path.join(data_dir, "mixed-regions.page.xml"))
@@ -164,6 +213,35 @@ def test_page_level():
     )
 
 
+@pytest.mark.parametrize(
+    "file",
+    [
+        "actevedef_718448162/OCR-D-GT-PAGE/00000024.page.xml",
+        "order.page.xml",
+        "mixed-regions.page.xml",
+        "levels-are-different.page.xml",
+        "table-order/table-order-0002.xml",
+        "table-order/table-no-reading-order.xml",
+    ],
+)
+@pytest.mark.parametrize("textequiv_level", ["region", "line"])
+def test_parse_xml_page(file, textequiv_level):
+    filename = os.path.join(data_dir, file)
+    tree = parse_xml(filename)
+
+    # The geometry and glyphs are gone, but the text is the same
+    assert tree.find(".//{*}Coords") is None
+    assert tree.find(".//{*}Glyph") is None
+    assert page_text(tree, textequiv_level=textequiv_level) == page_text(
+        ET.parse(filename), textequiv_level=textequiv_level
+    )
+
+
+def test_parse_xml_alto():
+    filename = os.path.join(data_dir, "test.alto3.xml")
+    assert ET.tostring(parse_xml(filename)) == ET.tostring(ET.parse(filename))
+
+
 def test_text():
     assert "being erected at the Broadway stock" in text(
         os.path.join(data_dir, "test.alto1.xml")
@@ -174,6 +252,47 @@ def test_text():
     assert "Lorem ipsum" in text(os.path.join(data_dir, "test.txt"))
 
 
+@pytest.mark.parametrize(
+    "head,expected",
+    [
+        (b"<PcGts xmlns='x'>", "page"),
+        (b'<?xml version="1.0"?>\n<!-- <alto> -->\n<pc:PcGts>', "page"),
+        (b"\xef\xbb\xbf<?xml version='1.0'?><alto xmlns='y'>", "alto"),
+        ("<?xml version='1.0' encoding='UTF-16'?><alto>".encode("utf-16"), "alto"),
+        (b'<!DOCTYPE foo [<!ENTITY a "b">]><foo/>', "xml"),
+        (b"<?xml version='1.0'?><!-- truncated", "xml"),
+        (b"Lorem ipsum <b>", "plain"),
+        (b"", "plain"),
+    ],
+)
+def test_sniff_format(head, expected):
+    assert sniff_format(head) == expected
+
+
+@pytest.mark.parametrize("file", ["test.page2018.xml", "test.alto3.xml", "test.txt"])
+def test_extract_reads_once(file, monkeypatch):
+    filename = os.path.join(data_dir, file)
+    expected = text(filename)
+
+    opened = []
+    real_open = builtins.open
+
+    def counting_open(name, *args, **kwargs):
+        opened.append(name)
+        return real_open(name, *args, **kwargs)
+
+    monkeypatch.setattr(builtins, "open", counting_open)
+    assert text(filename) == expected
+    assert opened == [filename]
+
+
+def test_extract_not_xml(tmp_path):
+    # Looks like XML, but is not
+    fn = tmp_path / "ocr.txt"
+    fn.write_text("<3 First, a line.\n", encoding="utf-8")
+    assert text(str(fn)) == "<3 First, a line."
+
+
 def test_plain(tmp_path):
     with working_directory(tmp_path):
         with open("ocr.txt", "w") as ocrf:
@@ -194,3 +313,73 @@ def test_plain_BOM(tmp_path):
         result = plain_text("ocr.txt")
         expected = "First, a line.\nAnd a second line."
         assert result == expected
+
+
+@pytest.mark.parametrize(
+    "data,expected",
+    [
+        (b"\xef\xbb\xbfFirst", "utf-8-sig"),
+        ("First".encode("utf-16"), "utf-16"),
+        ("Fürst".encode("utf-8"), "utf-8"),
+        (b"First", "utf-8"),
+    ],
+)
+def test_autodetect_encoding(data, expected, monkeypatch):
+    def no_chardet(*args):
+        raise AssertionError("chardet is not needed")
+
+    monkeypatch.setattr(ocr_files, "detect_encoding", no_chardet)
+    assert ocr_files.autodetect_encoding("ocr.txt", data) == expected
+
+
+def test_autodetect_encoding_per_file(tmp_path, caplog):
+    german = tmp_path / "a.gt.txt"
+    german.write_bytes("Grüße aus Köln, Straße\n".encode("latin-1"))
+    turkish = tmp_path / "b.gt.txt"
+    turkish.write_bytes("Ağır şişe, küçük çiçek\n".encode("cp1254"))
+    expected = {
+        fn: fn.read_bytes().decode(ocr_files.detect_encoding(str(fn))).strip()
+        for fn in (german, turkish)
+    }
+
+    # The encoding of a file does not depend on the files read before
+    for order in ((german, turkish), (turkish, german)):
+        for fn in order:
+            assert plain_text(str(fn)) == expected[fn]
+
+    # The warnings are summarized
+    warnings = [r for r in caplog.records if "Autodetected" in r.message]
+    assert len(warnings) == len(set(r.message for r in warnings))
+
+
+def test_plain_streaming(tmp_path, monkeypatch):
+    # Decode in tiny chunks, splitting multi-byte characters and CR LF
+    monkeypatch.setattr(ocr_files, "_CHUNK_SIZE", 3)
+    fn = tmp_path / "ocr.txt"
+    fn.write_bytes("Straße\r\nſtraße\rStraße\n\nſtraße".encode("utf-8"))
+
+    extracted = ocr_files.plain_extract(str(fn))
+    assert extracted.text == "Straße\nſtraße\nStraße\n\nſtraße"
+    assert ocr_files.autodetect_encoding(str(fn), fn.read_bytes()) == "utf-8"
+
+    # The lines share their grapheme cluster strings
+    assert extracted.segments is not None
+    clusters = [c for s in extracted.segments for c in s.grapheme_clusters]
+    assert len({id(c) for c in clusters}) == len(set(clusters))
+
+
+def test_plain_empty(tmp_path):
+    fn = tmp_path / "empty.txt"
+    fn.write_bytes(b"")
+    assert text(str(fn)) == ""
+
+
+def test_map_file_empty(tmp_path):
+    fn = tmp_path / "empty.txt"
+    fn.write_bytes(b"")
+    with pytest.raises(KeyError) as excinfo:
+        with ocr_files.map_file(str(fn)) as data:
+            assert data == b""
+            raise KeyError("caller")
+    # The exception is not chained to the failed attempt to map the empty file
+    assert excinfo.value.__context__ is None
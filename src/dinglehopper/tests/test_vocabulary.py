@@ -0,0 +1,87 @@
+import pickle
+
+from .. import ExtractedText
+from ..cli import gen_diff_report
+from ..vocabulary import Vocabulary
+
+
+def test_vocabulary():
+    vocabulary: Vocabulary[str] = Vocabulary()
+    codes = vocabulary.encode(["a", "m̃", "a", "b"])
+    assert list(codes) == [0, 1, 0, 2]
+    assert len(vocabulary) == 3
+    assert vocabulary.decode(codes) == ["a", "m̃", "a", "b"]
+    assert vocabulary.item(1) == "m̃"
+
+    # Codes are stable when the vocabulary grows
+    assert list(vocabulary.encode(["c", "a"])) == [3, 0]
+    assert vocabulary.code("b") == 2
+
+
+def test_vocabulary_copy():
+    vocabulary: Vocabulary[str] = Vocabulary()
+    vocabulary.encode(["a", "b"])
+    copy = vocabulary.copy()
+    assert list(copy.encode(["b", "c"])) == [1, 2]
+    assert len(copy) == 3
+    assert len(vocabulary) == 2
+    assert "c" not in vocabulary
+
+
+def test_extracted_text_grapheme_cluster_codes():
+    vocabulary: Vocabulary[str] = Vocabulary()
+    text = ExtractedText.from_str("Schlym̃ ſoll")
+    codes = text.encode_grapheme_clusters(vocabulary)
+    assert len(codes) == len(text.grapheme_clusters) == 11
+    assert vocabulary.decode(codes) == text.grapheme_clusters
+
+    # Texts encoded with the same vocabulary share the codes
+    other_codes = ExtractedText.from_str("ſoll").encode_grapheme_clusters(vocabulary)
+    assert list(other_codes) == list(codes[-4:])
+
+
+def test_extracted_text_words():
+    vocabulary: Vocabulary[str] = Vocabulary()
+    text = ExtractedText.from_str("Schlym̃ ſoll ſoll")
+    assert text.words == ["Schlym̃", "ſoll", "ſoll"]
+    codes = vocabulary.encode(text.words)
+    assert codes[1] == codes[2]
+    assert vocabulary.decode(codes) == text.words
+
+    # The words are pickled
+    state = pickle.loads(pickle.dumps(text)).__dict__
+    assert state["words"] == text.words
+
+
+def test_extracted_text_encoded():
+    gt = ExtractedText.from_str("Schlym̃ ſoll")
+    encoded = gt.encoded
+    assert gt.encoded is encoded
+    assert encoded.clusters.decode(encoded.cluster_codes) == gt.grapheme_clusters
+    assert encoded.words.decode(encoded.word_codes) == gt.words
+
+    # Other texts share the codes, but do not grow the vocabularies of the text
+    n_clusters, n_words = len(encoded.clusters), len(encoded.words)
+    other = encoded.encode_other(ExtractedText.from_str("Schlyñ ſoll"))
+    assert list(other.word_codes) == [len(encoded.words), encoded.word_codes[1]]
+    assert other.words.decode(other.word_codes) == ["Schlyñ", "ſoll"]
+    assert (len(encoded.clusters), len(encoded.words)) == (n_clusters, n_words)
+
+    # The encoding is not pickled
+    assert "encoded" not in pickle.loads(pickle.dumps(gt)).__dict__
+
+
+def test_gen_diff_report_vocabulary():
+    vocabulary: Vocabulary[str] = Vocabulary()
+    gt = ExtractedText.from_str("a b c a b")
+    ocr = ExtractedText.from_str("a x c a x")
+    _, counted = gen_diff_report(
+        vocabulary.encode(gt.words),
+        vocabulary.encode(ocr.words),
+        css_prefix="w",
+        joiner=" ",
+        none="⋯",
+        differences=True,
+        vocabulary=vocabulary,
+    )
+    assert counted == {"b :: x": 2}
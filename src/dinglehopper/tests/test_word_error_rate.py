@@ -1,8 +1,18 @@
 from __future__ import division, print_function
 
 import math
+from concurrent.futures import ThreadPoolExecutor
 
-from .. import word_error_rate, words
+import uniseg.wordbreak
+
+from .. import word_error_rate, word_error_rate_batch, words
+from ..word_error_rate import (
+    _WHITESPACE,
+    _chunk_words,
+    _segment_words,
+    _simple_word_characters,
+    _word_break_property,
+)
 
 
 def test_words():
@@ -24,6 +34,34 @@ def test_words():
     assert result == expected
 
 
+def test_words_chunks():
+    # The combining character belongs to the whitespace, see UAX #29 rule WB4
+    assert list(words("Foo \u0301bar baz")) == ["Foo", "bar", "baz"]
+    assert list(words("3.14  Meter\r\nweit")) == ["3.14", "Meter", "weit"]
+    # U+202F NARROW NO-BREAK SPACE is not whitespace but ExtendNumLet
+    assert list(words("\u00a0\u202fFoo\u202fbar")) == ["\u202fFoo\u202fbar"]
+    assert list(words("")) == []
+    assert list(words("  ")) == []
+
+
+def test_words_simple_word_characters():
+    """Check the fast path of the word segmentation against the slow path."""
+    assert list(words("Preis \u02c2 5 \u02d7 3 x")) == ["Preis", "5", "3", "x"]
+    for c in _simple_word_characters():
+        for chunk in (c + " ", c + "a1" + c + "\n"):
+            assert _chunk_words(chunk) == _segment_words(chunk), repr(chunk)
+
+
+def test_words_whitespace():
+    """Check our list of whitespace characters against uniseg's data."""
+    whitespace = {
+        chr(cp)
+        for cp in range(0x110000)
+        if _word_break_property(chr(cp)) in ("cr", "lf", "newline", "wsegspace")
+    }
+    assert whitespace == set(_WHITESPACE)
+
+
 def test_words_private_use_area():
     result = list(
         words(
@@ -53,6 +91,21 @@ def test_words_private_use_area():
     assert result == expected
 
 
+def test_words_private_use_area_no_patch():
+    word_break = uniseg.wordbreak.word_break
+    # Not followed by whitespace, so it does not take the fast path
+    assert list(words("\ue5ccb\u0301\ueba7,")) == ["\ue5ccb\u0301\ueba7"]
+    assert uniseg.wordbreak.word_break is word_break
+    assert uniseg.wordbreak.word_break("\ue5cc").name.lower() == "other"
+
+
+def test_words_threads():
+    texts = [f"Text {i}, \ue5cc\u0301{i} ſtraße-{i}!" for i in range(200)]
+    expected = [list(words(t)) for t in texts]
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        assert list(executor.map(lambda t: list(words(t)), texts)) == expected
+
+
 def test_word_error_rate():
     assert (
         word_error_rate("Dies ist ein Beispielsatz!", "Dies ist ein Beispielsatz!") == 0
@@ -85,3 +138,26 @@ def test_word_error_rate():
         )
         == 1 / 6
     )
+
+
+def test_word_error_rate_batch():
+    references = [
+        "Dies ist ein Beispielsatz!",
+        "Dies ist ein Beispielsatz!",
+        "",
+        "",
+        ["Dies", "ist", "ein", "Beispielsatz"],
+    ]
+    compared = [
+        "Dies ein ist Beispielsatz!",
+        "",
+        "Dies ist ein Beispielsatz!",
+        "",
+        ["Dies", "ist", "kein", "Beispielsatz"],
+    ]
+
+    d, n, wer = word_error_rate_batch(references, compared)
+
+    assert list(d) == [2, 4, 4, 0, 1]
+    assert list(n) == [4, 4, 0, 0, 4]
+    assert list(wer) == [word_error_rate(r, c) for r, c in zip(references, compared)]
@@ -0,0 +1,79 @@
+import threading
+from array import array
+from typing import Dict, Generic, Hashable, Iterable, List, Sequence, TypeVar
+
+T = TypeVar("T", bound=Hashable)
+
+
+class Vocabulary(Generic[T]):
+    """
+    Map items (e.g. grapheme clusters) to integer codes.
+
+    The vocabulary grows as new items are encoded. Codes are never reassigned, so
+    encoded sequences stay valid for the lifetime of the vocabulary, and a vocabulary
+    may be shared by many documents, e.g. a whole batch run.
+
+    RapidFuzz can compare integer sequences without hashing every element, and an
+    array("I") is much smaller than a list of tiny str objects.
+
+    A vocabulary may be shared by several threads.
+    """
+
+    def __init__(self) -> None:
+        self._codes: Dict[T, int] = {}
+        self._items: List[T] = []
+        # Only growing the vocabulary needs the lock, lookups don't
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __contains__(self, item: object) -> bool:
+        return item in self._codes
+
+    def code(self, item: T) -> int:
+        """Return the code for the given item, adding it if necessary."""
+        try:
+            return self._codes[item]
+        except KeyError:
+            with self._lock:
+                return self._add(item)
+
+    def _add(self, item: T) -> int:
+        # The caller holds the lock. Another thread may have added the item already.
+        code = self._codes.get(item)
+        if code is None:
+            code = len(self._items)
+            # Add the item before its code, so the code can be decoded once it is
+            # visible
+            self._items.append(item)
+            self._codes[item] = code
+        return code
+
+    def copy(self) -> "Vocabulary[T]":
+        """Return a copy of the vocabulary, which grows independently of it."""
+        vocabulary: Vocabulary[T] = Vocabulary()
+        with self._lock:
+            vocabulary._codes = self._codes.copy()
+            vocabulary._items = self._items.copy()
+        return vocabulary
+
+    def item(self, code: int) -> T:
+        """Return the item for the given code."""
+        return self._items[code]
+
+    def encode(self, items: Iterable[T]) -> array:
+        """Encode the given items as an array of integer codes."""
+        if not isinstance(items, Sequence):
+            items = list(items)
+        codes = self._codes
+        missing = [item for item in dict.fromkeys(items) if item not in codes]
+        if missing:
+            with self._lock:
+                for item in missing:
+                    self._add(item)
+        return array("I", map(codes.__getitem__, items))
+
+    def decode(self, codes: Iterable[int]) -> List[T]:
+        """Decode the given codes back to a list of items."""
+        return list(map(self._items.__getitem__, codes))
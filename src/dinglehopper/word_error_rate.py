@@ -1,70 +1,154 @@
+import functools
+import itertools
+import re
 import unicodedata
-from typing import Generator, Iterable, Tuple, TypeVar
-
+from array import array
+from typing import (
+    FrozenSet,
+    Generator,
+    Iterable,
+    Iterator,
+    Sequence,
+    Tuple,
+    TypeVar,
+    Union,
+)
+
+import numpy as np
 import uniseg.wordbreak
 from multimethod import multimethod
 from rapidfuzz.distance import Levenshtein
 
+from .align import Alignment
+from .character_error_rate import _error_rates
+from .edit_distance import distance_batch
 from .extracted_text import ExtractedText
+from .vocabulary import Vocabulary
 
 T = TypeVar("T")
 
-# Did we patch uniseg.wordbreak.word_break already?
-word_break_patched = False
-
-
-def patch_word_break():
+# Characters with the word break property CR, LF, Newline or WSegSpace. There always
+# is a word boundary before a run of these and after it, unless the run is followed
+# by an Extend, Format or ZWJ character. See
+# https://www.unicode.org/reports/tr29/#Word_Boundary_Rules
+_WHITESPACE = (
+    "\n\r\x0b\x0c\x85\u2028\u2029"
+    "\x20\u1680\u2000\u2001\u2002\u2003\u2004\u2005\u2006\u2008\u2009\u200a"
+    "\u205f\u3000"
+)
+_whitespace_split = re.compile(f"([{_WHITESPACE}]+)").split
+
+
+# We treat the characters of the Private Use Area as letters, as we use them for
+# letters, see MUFI. For uniseg, we substitute them by a letter of the same length.
+# See also
+# https://www.unicode.org/Public/UCD/latest/ucd/auxiliary/WordBreakProperty.txt
+_PRIVATE_USE = "\ue000-\uf8ff"
+_private_use_search = re.compile(f"[{_PRIVATE_USE}]").search
+_private_use_to_letter = dict.fromkeys(range(0xE000, 0xF900), "a")
+
+
+def _word_break_property(c: str) -> str:
+    """Return the name of the word break property of c, e.g. "aletter"."""
+    if _private_use_search(c):
+        return "aletter"
+    # uniseg < 0.9 uses different enum member names, e.g. ALETTER instead of ALetter
+    name: str = uniseg.wordbreak.word_break(c).name
+    return name.replace("_", "").lower()
+
+
+def _segment(chunk: str) -> Iterator[str]:
+    """Split chunk on word boundaries, treating private use characters as letters."""
+    if not _private_use_search(chunk):
+        yield from uniseg.wordbreak.words(chunk)
+        return
+    start = 0
+    for word in uniseg.wordbreak.words(chunk.translate(_private_use_to_letter)):
+        end = start + len(word)
+        yield chunk[start:end]
+        start = end
+
+
+@functools.lru_cache(maxsize=None)
+def _is_ignorable(c: str) -> bool:
+    """Check if c is ignored by the word break rules, see rule WB4."""
+    return _word_break_property(c) in ("extend", "format", "zwj")
+
+
+@functools.lru_cache(maxsize=None)
+def _simple_word_characters() -> FrozenSet[str]:
     """
-    Patch uniseg.wordbreak.word_break to deal with our private use characters.
+    Return characters that always form a single word with each other.
 
-    See also
-    https://www.unicode.org/Public/UCD/latest/ucd/auxiliary/WordBreakProperty.txt
+    These are the characters with the word break property ALetter, Hebrew_Letter or
+    Numeric (see rules WB5 and WB8 to WB10) from the blocks used by most of our
+    texts, and the private use characters. Unwanted characters, e.g. the modifier
+    symbols with the property ALetter, are not included, as a word of them only is
+    dropped.
     """
-    old_word_break = uniseg.wordbreak.word_break
-    if hasattr(uniseg.wordbreak, 'Word_Break'):
-        aletter = uniseg.wordbreak.Word_Break.ALetter
-    else:
-        # uniseg<0.9
-        aletter = uniseg.wordbreak.WordBreak.ALETTER
-
-    def new_word_break(c):
-        if 0xE000 <= ord(c) <= 0xF8FF:  # Private Use Area
-            return aletter
-        else:
-            return old_word_break(c)
+    candidates = itertools.chain(range(0x0000, 0x0590), range(0xE000, 0xF900))
+    return frozenset(
+        c
+        for c in map(chr, candidates)
+        if _word_break_property(c) in ("aletter", "hebrewletter", "numeric")
+        and not _unwanted(c)
+    )
 
-    uniseg.wordbreak.word_break = new_word_break
-    global word_break_patched
-    word_break_patched = True
 
+# Check if c is an unwanted character, i.e. whitespace, punctuation, or similar
+@functools.lru_cache(maxsize=None)
+def _unwanted(c: str) -> bool:
+    # See https://www.fileformat.info/info/unicode/category/index.htm
+    # and https://unicodebook.readthedocs.io/unicode.html#categories
+    unwanted_categories = "O", "M", "P", "Z", "S"
+    unwanted_subcategories = "Cc", "Cf"
 
-@multimethod
-def words(s: str) -> Generator[str, None, None]:
-    """Extract words from a string"""
+    subcat = unicodedata.category(c)
+    cat = subcat[0]
+    return cat in unwanted_categories or subcat in unwanted_subcategories
+
+
+@functools.lru_cache(maxsize=2**16)
+def _chunk_words(chunk: str) -> Tuple[str, ...]:
+    """Return the words of a chunk of text, see words()."""
 
-    global word_break_patched
-    if not word_break_patched:
-        patch_word_break()
+    # Fast path: The chunk is a single simple word, followed by whitespace
+    word = chunk.rstrip(_WHITESPACE)
+    if not word or set(word) <= _simple_word_characters():
+        return (word,) if word else ()
+    return _segment_words(chunk)
 
-    # Check if c is an unwanted character, i.e. whitespace, punctuation, or similar
-    def unwanted(c):
-        # See https://www.fileformat.info/info/unicode/category/index.htm
-        # and https://unicodebook.readthedocs.io/unicode.html#categories
-        unwanted_categories = "O", "M", "P", "Z", "S"
-        unwanted_subcategories = "Cc", "Cf"
 
-        subcat = unicodedata.category(c)
-        cat = subcat[0]
-        return cat in unwanted_categories or subcat in unwanted_subcategories
+def _segment_words(chunk: str) -> Tuple[str, ...]:
+    """Return the words of a chunk of text, without the fast path of _chunk_words()."""
 
     # We follow Unicode Standard Annex #29 on Unicode Text Segmentation here: Split on
     # word boundaries using uniseg.wordbreak.words() and ignore all "words" that contain
     # only whitespace, punctuation "or similar characters."
-    for word in uniseg.wordbreak.words(s):
-        if all(unwanted(c) for c in word):
-            pass
+    return tuple(
+        word for word in _segment(chunk) if not all(_unwanted(c) for c in word)
+    )
+
+
+@multimethod
+def words(s: str) -> Generator[str, None, None]:
+    """Extract words from a string"""
+
+    # Split the text into chunks at runs of whitespace, where there always is a word
+    # boundary. The words of a chunk do not depend on the rest of the text, so we
+    # can segment (and cache) each chunk separately.
+    pieces = _whitespace_split(s)
+    chunk = pieces[0]
+    for i in range(1, len(pieces), 2):
+        chunk += pieces[i]
+        following = pieces[i + 1]
+        if following and _is_ignorable(following[0]):
+            # No boundary after the whitespace, see rule WB4
+            chunk += following
         else:
-            yield word
+            yield from _chunk_words(chunk)
+            chunk = following
+    yield from _chunk_words(chunk)
 
 
 @words.register
@@ -79,20 +163,24 @@ def words_normalized(s: str) -> Generator[str, None, None]:
 
 @words_normalized.register
 def _(s: ExtractedText) -> Generator[str, None, None]:
-    yield from words_normalized(s.text)
+    yield from s.words
 
 
 @multimethod
 def word_error_rate_n(reference: str, compared: str) -> Tuple[float, int]:
-    reference_seq = list(words_normalized(reference))
-    compared_seq = list(words_normalized(compared))
-    wer, n = word_error_rate_n(reference_seq, compared_seq)
+    vocabulary: Vocabulary[str] = Vocabulary()
+    wer, n = word_error_rate_n(
+        _word_codes(reference, vocabulary), _word_codes(compared, vocabulary)
+    )
     return wer, n
 
 
 @word_error_rate_n.register
 def _(reference: ExtractedText, compared: ExtractedText) -> Tuple[float, int]:
-    wer, n = word_error_rate_n(reference.text, compared.text)
+    vocabulary: Vocabulary[str] = Vocabulary()
+    wer, n = word_error_rate_n(
+        vocabulary.encode(reference.words), vocabulary.encode(compared.words)
+    )
     return wer, n
 
 
@@ -111,6 +199,48 @@ def _(reference: Iterable[T], compared: Iterable[T]) -> Tuple[float, int]:
     return d / n, n
 
 
+@word_error_rate_n.register
+def _(alignment: Alignment) -> Tuple[float, int]:
+    """Compute word error rate from an alignment of words."""
+    return alignment.error_rate_n()
+
+
+def _word_codes(
+    s: Union[str, ExtractedText, Iterable[str]], vocabulary: Vocabulary[str]
+) -> array:
+    """Encode the words of s with the given vocabulary, which only lives for a call."""
+    if isinstance(s, ExtractedText):
+        return vocabulary.encode(s.words)
+    if isinstance(s, str):
+        return vocabulary.encode(words_normalized(s))
+    return vocabulary.encode(s)
+
+
+def word_error_rate_batch(
+    references: Sequence[Union[str, ExtractedText, Iterable[str]]],
+    compared: Sequence[Union[str, ExtractedText, Iterable[str]]],
+    *,
+    workers: int = -1,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Compute word error rates of many pairs, e.g. lines, at once.
+
+    references[i] is compared with compared[i], either texts or sequences of words.
+    The edit distances are computed in RapidFuzz using the given number of threads
+    (-1: all CPUs).
+
+    :return: edit distances, lengths of the references and word error rates, as
+        NumPy arrays
+    """
+    # The words are encoded with a vocabulary of this batch only
+    vocabulary: Vocabulary[str] = Vocabulary()
+    seqs1 = [_word_codes(s, vocabulary) for s in references]
+    seqs2 = [_word_codes(s, vocabulary) for s in compared]
+    d = distance_batch(seqs1, seqs2, workers=workers)
+    n = np.fromiter(map(len, seqs1), dtype=np.int64, count=len(seqs1))
+    return d, n, _error_rates(d, n)
+
+
 def word_error_rate(reference: T, compared: T) -> float:
     wer: float
     wer, _ = word_error_rate_n(reference, compared)